@@ -1,4 +1,12 @@
-import io, os, base64, json, uuid, requests, pandas as pd, numpy as np, streamlit as st, time
+import io, os, base64, json, uuid, hashlib, requests, pandas as pd, numpy as np, streamlit as st, time
+import http_client
+import history_store
+import write_behind
+import storage
+import ledger
+import cashflow
+import valuation
+from compact_history import BARS_NAME, bars_to_ticks
 from datetime import datetime, date
 from steam_integration import get_steam_id_from_vanity, fetch_steam_inventory, detect_new_skins, import_new_skins_to_holdings, validate_steam_api_key, check_inventory_accessibility
 
@@ -73,9 +81,17 @@ BRANCH  = st.secrets.get("GH_BRANCH", "main")
 GH_PAT  = st.secrets.get("GH_PAT")
 CSFLOAT_API_KEY = st.secrets.get("CSFLOAT_API_KEY")
 STEAM_API_KEY = st.secrets.get("STEAM_API_KEY", "")
-CSFLOAT_API = "https://csfloat.com/api/v1/listings"
+# Bases d'URL surchargeables (ex: stub_server.py en local)
+CSFLOAT_API_BASE = st.secrets.get("CSFLOAT_API_BASE", os.getenv("CSFLOAT_API_BASE", "https://csfloat.com")).rstrip("/")
+GITHUB_API = st.secrets.get("GITHUB_API_BASE", os.getenv("GITHUB_API_BASE", "https://api.github.com")).rstrip("/")
+CSFLOAT_API = f"{CSFLOAT_API_BASE}/api/v1/listings"
 CSFLOAT_HEADERS = {"Authorization": CSFLOAT_API_KEY} if CSFLOAT_API_KEY else {}
 
+# Persistance locale : "csv" (fichiers historiques) ou "sqlite" (data/<profil>/portfolio.sqlite, cf. storage.py)
+STORAGE_BACKEND = st.secrets.get("STORAGE_BACKEND", os.getenv("STORAGE_BACKEND", "csv"))
+# Méthode de coût des positions, de l'historique et du P&L réalisé : "fifo", "lifo" ou "average" (cf. ledger.py)
+COST_METHOD = st.secrets.get("COST_METHOD", os.getenv("COST_METHOD", "fifo")).lower()
+
 PROFILES = ["pierre", "elenocames"]
 profile = st.radio("Profil", PROFILES, horizontal=True, key="profile_select")
 
@@ -84,6 +100,11 @@ os.makedirs(DATA_DIR, exist_ok=True)
 PATH_TRADES   = f"{DATA_DIR}/trades.csv"
 PATH_HOLDINGS = f"{DATA_DIR}/holdings.csv"
 PATH_HISTORY  = f"{DATA_DIR}/price_history.csv"
+PATH_HISTORY_PARQUET = f"{DATA_DIR}/{history_store.DATASET_DIRNAME}"  # optionnel (history_store.py)
+PATH_HISTORY_SCHEMA = history_store.schema_path(PATH_HISTORY)  # sidecar de version (cents canoniques)
+PATH_BARS     = f"{DATA_DIR}/{BARS_NAME}"  # barres journalières (compact_history.py)
+PATH_VALUE    = f"{DATA_DIR}/{valuation.VALUE_NAME}"  # série de valeur matérialisée (valuation.py, écrite par le robot)
+PATH_VALUE_META = f"{DATA_DIR}/{valuation.META_NAME}"  # lignes de portfolio_value.dirty.jsonl déjà traitées
 
 # ---------- FICHIERS FINANCE ----------
 PATH_FINANCE       = f"{DATA_DIR}/finances.csv"
@@ -94,28 +115,240 @@ PATH_FIN_BASELINE  = f"{DATA_DIR}/finance_baseline.csv"
 def _gh_headers():
     return {"Authorization": f"Bearer {GH_PAT}", "Accept": "application/vnd.github+json"}
 
+@st.cache_resource
+def _gh_sha_cache():
+    """SHA du blob GitHub par chemin (partagé entre les reruns) : évite un GET avant chaque PUT."""
+    return {}
+
+@st.cache_resource
+def _gh_head_cache():
+    """Dernier commit connu de la branche -> son arbre : évite un GET commit quand rien n'a bougé."""
+    return {}
+
 def gh_get_file(path):
-    url = f"https://api.github.com/repos/{OWNER}/{REPO}/contents/{path}?ref={BRANCH}"
+    url = f"{GITHUB_API}/repos/{OWNER}/{REPO}/contents/{path}?ref={BRANCH}"
     r = requests.get(url, headers=_gh_headers(), timeout=20)
     if r.status_code != 200:
+        if r.status_code == 404:
+            _gh_sha_cache()[path] = None
         return "", None, r.status_code
     j = r.json()
     try:
         raw = base64.b64decode(j["content"]).decode("utf-8")
     except Exception:
         raw = ""
+    _gh_sha_cache()[path] = j.get("sha")
     return raw, j.get("sha"), r.status_code
 
+LIST_MISSING_TTL = 900  # secondes pendant lesquelles un dossier absent (404) n'est pas redemandé
+
+def gh_list_dir(path, missing_ttl=0):
+    """
+    Listing d'un dossier, conditionnel (If-None-Match) : un 304 renvoie la liste déjà connue.
+    missing_ttl > 0 : un 404 est retenu ce nombre de secondes, sans nouvelle requête entre-temps.
+    """
+    raw_cache = _gh_raw_cache()
+    missing = raw_cache.get(("missing", path))
+    if missing_ttl and missing is not None and time.time() - missing < missing_ttl:
+        return []
+    hit = raw_cache.get(("list", path))
+    headers = _gh_headers()
+    if hit:
+        headers = {**headers, "If-None-Match": hit[0]}
+    url = f"{GITHUB_API}/repos/{OWNER}/{REPO}/contents/{path}?ref={BRANCH}"
+    r = requests.get(url, headers=headers, timeout=20)
+    if r.status_code == 304 and hit:
+        return hit[1]
+    if r.status_code != 200:
+        if r.status_code == 404:
+            raw_cache[("missing", path)] = time.time()
+            raw_cache.pop(("list", path), None)
+        return []
+    raw_cache.pop(("missing", path), None)
+    j = r.json()
+    if not isinstance(j, list):
+        return []
+    cache = _gh_sha_cache()
+    for e in j:
+        if e.get("type") == "file" and e.get("path"):
+            cache[e["path"]] = e.get("sha")
+    if r.headers.get("ETag"):
+        raw_cache[("list", path)] = (r.headers["ETag"], j)
+    return j
+
+@st.cache_resource
+def _gh_raw_cache():
+    """clé -> (ETag = SHA du blob, objet parsé) : partagé entre reruns et sessions."""
+    return {}
+
+def gh_get_raw_parsed(path, parse, key=None):
+    """
+    GET raw conditionnel (If-None-Match) : un 304 renvoie l'objet déjà parsé pour ce SHA,
+    sans téléchargement ni parsing. `key` distingue plusieurs lectures d'un même fichier.
+    """
+    cache = _gh_raw_cache()
+    key = key or path
+    hit = cache.get(key)
+    url = f"{GITHUB_API}/repos/{OWNER}/{REPO}/contents/{path}?ref={BRANCH}"
+    headers = {**_gh_headers(), "Accept": "application/vnd.github.raw"}
+    if hit:
+        headers["If-None-Match"] = hit[0]
+    r = requests.get(url, headers=headers, timeout=30)
+    if r.status_code == 304 and hit:
+        return hit[1], 200
+    if r.status_code != 200:
+        return None, r.status_code
+    obj = parse(r.content)
+    etag = r.headers.get("ETag")
+    if etag:
+        cache[key] = (etag, obj)
+    return obj, 200
+
+TAIL_OVERLAP = 256  # octets relus avant l'offset pour vérifier que le début du fichier n'a pas été réécrit
+
+def gh_get_csv_tail(path, on_rows=None):
+    """
+    CSV append-only (price_history.csv) lu par la fin : on garde l'offset en octets de la dernière
+    ligne complète parsée et on ne demande que la suite (Range + If-None-Match, une seule requête).
+    Les TAIL_OVERLAP octets avant l'offset doivent être identiques au cache ; sinon (fichier réécrit
+    par la compaction, une fois par palier RAW_PRUNE_STEP_DAYS ; en-tête modifié) ou sur 416, relecture complète. `on_rows` reçoit uniquement
+    les lignes nouvelles. Renvoie (frame complet partagé, status).
+    """
+    cache = _gh_raw_cache()
+    key = ("tail", path)
+    state = cache.get(key)
+    url = f"{GITHUB_API}/repos/{OWNER}/{REPO}/contents/{path}?ref={BRANCH}"
+    headers = {**_gh_headers(), "Accept": "application/vnd.github.raw"}
+    if state:
+        start = max(0, state["offset"] - TAIL_OVERLAP)
+        headers["If-None-Match"] = state["etag"]
+        headers["Range"] = f"bytes={start}-"
+        r = requests.get(url, headers=headers, timeout=30)
+        if r.status_code == 304:
+            return state["frame"], 200
+        if r.status_code == 206:
+            body = r.content
+            known = state["offset"] - start
+            if not known or body[:known] == state["tail"][-known:]:
+                new = body[known:]
+                cut = new.rfind(b"\n") + 1  # ligne en cours d'écriture : gardée pour le prochain appel
+                frame = state["frame"]
+                if cut:
+                    rows = _parse_csv_blob(state["header"] + new[:cut])
+                    if not rows.empty:
+                        frame = pd.concat([frame, rows], ignore_index=True) if not frame.empty else rows
+                        if on_rows:
+                            on_rows(rows)
+                cache[key] = {**state, "etag": r.headers.get("ETag", state["etag"]), "frame": frame,
+                              "offset": state["offset"] + cut, "tail": (state["tail"] + new[:cut])[-TAIL_OVERLAP:]}
+                return frame, 200
+        elif r.status_code not in (200, 416):
+            return None, r.status_code
+        if r.status_code == 200:  # serveur sans Range : contenu complet déjà reçu
+            return _tail_full_parse(cache, key, r, on_rows), 200
+        headers.pop("Range"); headers.pop("If-None-Match")
+    r = requests.get(url, headers=headers, timeout=30)
+    if r.status_code != 200:
+        return None, r.status_code
+    return _tail_full_parse(cache, key, r, on_rows), 200
+
+def _tail_full_parse(cache, key, r, on_rows):
+    body = r.content
+    cut = body.rfind(b"\n") + 1
+    frame = _parse_csv_blob(body[:cut])
+    if on_rows and not frame.empty:
+        on_rows(frame)
+    header = body[:body.find(b"\n") + 1]
+    cache[key] = {"etag": r.headers.get("ETag", ""), "frame": frame, "header": header,
+                  "offset": cut, "tail": body[:cut][-TAIL_OVERLAP:]}
+    return frame
+
 def gh_put_file(path, content, sha, message):
-    url = f"https://api.github.com/repos/{OWNER}/{REPO}/contents/{path}"
+    url = f"{GITHUB_API}/repos/{OWNER}/{REPO}/contents/{path}"
     payload = {"message": message, "content": base64.b64encode(content.encode("utf-8")).decode("ascii"), "branch": BRANCH}
     if sha:
         payload["sha"] = sha
     r = requests.put(url, headers=_gh_headers(), data=json.dumps(payload), timeout=20)
+    if 200 <= r.status_code < 300:
+        try:
+            j = r.json()
+            _gh_sha_cache()[path] = j["content"]["sha"]
+            heads = _gh_head_cache()
+            heads.clear()
+            heads[j["commit"]["sha"]] = j["commit"]["tree"]["sha"]
+        except Exception:
+            _gh_sha_cache().pop(path, None)
     return r
 
+def gh_save_file(path, content, message):
+    """
+    PUT avec le SHA en cache. Premier accès : une seule liste du dossier remplit le cache
+    pour tous ses fichiers. Conflit (409/422, SHA périmé) : on relit le SHA et on réessaie une fois.
+    """
+    cache = _gh_sha_cache()
+    if path not in cache:
+        gh_list_dir(os.path.dirname(path))
+        cache.setdefault(path, None)  # absent du dossier : création
+    resp = gh_put_file(path, content, cache.get(path), message)
+    if resp.status_code in (409, 422):
+        _text, sha, _ = gh_get_file(path)
+        resp = gh_put_file(path, content, sha, message)
+    return resp
+
+def _git_blob_sha(content):
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def _gh_git_commit_once(files, message):
+    """ref -> (commit) -> tree (contenus inline) -> commit -> PATCH ref. Renvoie la dernière réponse."""
+    git = f"{GITHUB_API}/repos/{OWNER}/{REPO}/git"
+    r = requests.get(f"{git}/ref/heads/{BRANCH}", headers=_gh_headers(), timeout=20)
+    if r.status_code != 200:
+        return r
+    head = r.json()["object"]["sha"]
+    heads = _gh_head_cache()
+    base_tree = heads.get(head)
+    if base_tree is None:
+        r = requests.get(f"{git}/commits/{head}", headers=_gh_headers(), timeout=20)
+        if r.status_code != 200:
+            return r
+        base_tree = r.json()["tree"]["sha"]
+    tree = [{"path": p, "mode": "100644", "type": "blob", "content": c} for p, c in files.items()]
+    r = requests.post(f"{git}/trees", headers=_gh_headers(), data=json.dumps({"base_tree": base_tree, "tree": tree}), timeout=30)
+    if r.status_code != 201:
+        return r
+    new_tree = r.json()["sha"]
+    r = requests.post(f"{git}/commits", headers=_gh_headers(),
+                      data=json.dumps({"message": message, "tree": new_tree, "parents": [head]}), timeout=20)
+    if r.status_code != 201:
+        return r
+    commit = r.json()["sha"]
+    r = requests.patch(f"{git}/refs/heads/{BRANCH}", headers=_gh_headers(), data=json.dumps({"sha": commit, "force": False}), timeout=20)
+    if r.status_code == 200:
+        heads.clear()
+        heads[commit] = new_tree
+    return r
+
+def gh_commit_files(files, message):
+    """
+    Pousse {chemin: texte} en UN commit : tout ou rien côté GitHub.
+    Un seul fichier -> PUT contents (1 requête, SHA en cache) ; plusieurs -> Git Data API.
+    Si la branche a bougé entre-temps (422, pas de fast-forward), on rejoue une fois sur le nouveau head.
+    """
+    if len(files) == 1:
+        (path, content), = files.items()
+        return gh_save_file(path, content, message)
+    resp = _gh_git_commit_once(files, message)
+    if resp.status_code == 422:
+        resp = _gh_git_commit_once(files, message)
+    if resp.status_code == 200:
+        cache = _gh_sha_cache()
+        for path, content in files.items():
+            cache[path] = _git_blob_sha(content)
+    return resp
+
 def gh_dispatch_workflow(workflow_file="fetch-prices.yml"):
-    url = f"https://api.github.com/repos/{OWNER}/{REPO}/actions/workflows/{workflow_file}/dispatches"
+    url = f"{GITHUB_API}/repos/{OWNER}/{REPO}/actions/workflows/{workflow_file}/dispatches"
     payload = {"ref": BRANCH}
     r = requests.post(url, headers=_gh_headers(), data=json.dumps(payload), timeout=20)
     return r
@@ -136,129 +369,91 @@ def ensure_finance_files_exist():
 ensure_trades_exists()
 ensure_finance_files_exist()
 
+STORE = storage.open_storage(DATA_DIR, STORAGE_BACKEND)  # instance partagée entre les reruns
+
+def _push_files(files, message):
+    return gh_commit_files(files, message).status_code
+
+@st.cache_resource
+def _push_queue():
+    """Un seul writer de fond par process, partagé par toutes les sessions."""
+    return write_behind.WriteBehindQueue(os.path.join("data", write_behind.QUEUE_NAME), _push_files,
+                                         read=storage.read_mirror)
+
+def commit_tables(msg, insert=None, delete=None, replace=None):
+    """
+    Écrit dans le stockage local (un seul lot), puis met en file le push GitHub des fichiers
+    miroirs modifiés (journal seul pour un ajout / une suppression) : aucun appel réseau ici.
+    """
+    changed = STORE.write(insert=insert, delete=delete, replace=replace)
+    if GH_PAT and OWNER and changed:
+        _push_queue().enqueue(changed, msg)
+        st.toast("Enregistré. Envoi sur GitHub en arrière-plan.")
+
 # ---------- Trades I/O ----------
 def load_trades():
-    try:
-        return pd.read_csv(PATH_TRADES)
-    except Exception:
-        return pd.DataFrame(columns=["date","type","market_hash_name","qty","price_usd","note","trade_id"])
+    return STORE.load("trades")
 
 def save_trades(df, msg="update trades"):
-    df.to_csv(PATH_TRADES, index=False)
-    if GH_PAT and OWNER:
-        _text, sha, _ = gh_get_file(PATH_TRADES)
-        csv_buf = io.StringIO(); df.to_csv(csv_buf, index=False)
-        resp = gh_put_file(PATH_TRADES, csv_buf.getvalue(), sha, msg)
-        if 200 <= resp.status_code < 300:
-            st.toast("Modifications sauvegardées sur GitHub.")
-        else:
-            st.error(f"Erreur GitHub: {resp.status_code}")
+    commit_tables(msg, replace={"trades": df})
 
 # ---------- Holdings I/O (NOUVEAU : push sur GitHub) ----------
+def load_holdings():
+    return STORE.load("holdings")
+
 def save_holdings(df, msg="update holdings"):
-    df.to_csv(PATH_HOLDINGS, index=False)
-    if GH_PAT and OWNER:
-        _text, sha, _ = gh_get_file(PATH_HOLDINGS)
-        csv_buf = io.StringIO(); df.to_csv(csv_buf, index=False)
-        resp = gh_put_file(PATH_HOLDINGS, csv_buf.getvalue(), sha, msg)
-        if 200 <= resp.status_code < 300:
-            st.toast("Positions (holdings) sauvegardées sur GitHub.")
-        else:
-            st.error(f"Erreur GitHub (holdings): {resp.status_code}")
+    commit_tables(msg, replace={"holdings": df})
 
 # ---------- Finance I/O ----------
 def load_finances():
-    try:
-        return pd.read_csv(PATH_FINANCE)
-    except Exception:
-        return pd.DataFrame(columns=["date","type","amount_usd","note","finance_id"])
+    return STORE.load("finances")
 
 def save_finances(df, msg="update finances"):
-    df.to_csv(PATH_FINANCE, index=False)
-    if GH_PAT and OWNER:
-        _text, sha, _ = gh_get_file(PATH_FINANCE)
-        csv_buf = io.StringIO(); df.to_csv(csv_buf, index=False)
-        resp = gh_put_file(PATH_FINANCE, csv_buf.getvalue(), sha, msg)
-        if 200 <= resp.status_code < 300:
-            st.toast("Mouvements financiers sauvegardés sur GitHub.")
-        else:
-            st.error(f"Erreur GitHub: {resp.status_code}")
+    commit_tables(msg, replace={"finances": df})
 
 def load_csfloat_snapshot():
-    try:
-        return pd.read_csv(PATH_CSFLOAT_SNAP)
-    except Exception:
-        return pd.DataFrame(columns=["snapshot_date","balance_usd"])
+    return STORE.load("csfloat_snapshot")
 
 def save_csfloat_snapshot(df, msg="update csfloat snapshot"):
-    df.to_csv(PATH_CSFLOAT_SNAP, index=False)
-    if GH_PAT and OWNER:
-        _text, sha, _ = gh_get_file(PATH_CSFLOAT_SNAP)
-        csv_buf = io.StringIO(); df.to_csv(csv_buf, index=False)
-        resp = gh_put_file(PATH_CSFLOAT_SNAP, csv_buf.getvalue(), sha, msg)
-        if 200 <= resp.status_code < 300:
-            st.toast("Snapshot CSFloat sauvegardé sur GitHub.")
-        else:
-            st.error(f"Erreur GitHub: {resp.status_code}")
+    commit_tables(msg, replace={"csfloat_snapshot": df})
 
 def load_finance_baseline():
-    try:
-        return pd.read_csv(PATH_FIN_BASELINE)
-    except Exception:
-        return pd.DataFrame(columns=["baseline_date","baseline_net_deposited_usd","note"])
+    return STORE.load("finance_baseline")
 
 def save_finance_baseline(df, msg="update finance baseline"):
-    df.to_csv(PATH_FIN_BASELINE, index=False)
-    if GH_PAT and OWNER:
-        _text, sha, _ = gh_get_file(PATH_FIN_BASELINE)
-        csv_buf = io.StringIO(); df.to_csv(csv_buf, index=False)
-        resp = gh_put_file(PATH_FIN_BASELINE, csv_buf.getvalue(), sha, msg)
-        if 200 <= resp.status_code < 300:
-            st.toast("Baseline (capital net déposé) sauvegardée sur GitHub.")
-        else:
-            st.error(f"Erreur GitHub: {resp.status_code}")
+    commit_tables(msg, replace={"finance_baseline": df})
 
 # ---------- Calcul holdings ----------
-def rebuild_holdings(trades: pd.DataFrame):
-    if trades.empty:
-        pd.DataFrame(columns=["market_hash_name","qty","buy_price_usd","buy_date","notes"]).to_csv(PATH_HOLDINGS,index=False)
-        return pd.DataFrame()
-    holdings = []
-    for name, g in trades.groupby("market_hash_name"):
-        buys = g[g["type"]=="BUY"].copy().sort_values("date")
-        sells = g[g["type"]=="SELL"].copy().sort_values("date")
-
-        buy_lots = []
-        for _, row in buys.iterrows():
-            qty = float(row["qty"])
-            if qty <= 0:
-                continue
-            buy_lots.append({
-                "qty": qty,
-                "price_usd": float(row["price_usd"]),
-                "date": row["date"]
-            })
+@st.cache_resource
+def _ledger_engine(data_dir, method):
+    """Moteur du journal par profil et méthode de coût, gardé entre les reruns (cf. ledger.py)."""
+    return ledger.LedgerEngine(method)
+
+def ledger_read(trades: pd.DataFrame, read):
+    """read(moteur) sur le rejeu de `trades` ; sync + lecture sous le verrou du moteur, partagé entre sessions."""
+    eng = _ledger_engine(DATA_DIR, COST_METHOD)
+    with eng.lock:
+        eng.sync(trades)
+        return read(eng)
 
-        for _, row in sells.iterrows():
-            sell_qty = float(row["qty"])
-            if sell_qty <= 0:
-                continue
-            for lot in buy_lots:
-                if sell_qty <= 0:
-                    break
-                if lot["qty"] <= 0:
-                    continue
-                consumed = min(lot["qty"], sell_qty)
-                lot["qty"] -= consumed
-                sell_qty -= consumed
-
-        for lot in buy_lots:
-            if lot["qty"] > 0:
-                holdings.append([name, lot["qty"], lot["price_usd"], lot["date"], ""])
-
-    df = pd.DataFrame(holdings, columns=["market_hash_name","qty","buy_price_usd","buy_date","notes"])
-    df.to_csv(PATH_HOLDINGS, index=False)
-    return df
+def rebuild_holdings(trades: pd.DataFrame):
+    """Positions ouvertes selon COST_METHOD, lues dans le rejeu courant du journal."""
+    return ledger_read(trades, lambda eng: eng.open_lots()) if not trades.empty else pd.DataFrame()
+
+def persist_holdings(trades: pd.DataFrame):
+    """Réécrit holdings.csv seulement quand les positions de `trades` ont réellement changé."""
+    eng = _ledger_engine(DATA_DIR, COST_METHOD)
+    with eng.lock:
+        eng.sync(trades)
+        version = eng.version
+        if eng.persisted_version == version:
+            return
+        holdings = eng.open_lots()
+    df = holdings if not holdings.empty else storage.empty_frame("holdings")
+    if df.to_csv(index=False) != STORE.export_csv("holdings"):
+        STORE.write(replace={"holdings": df})
+    with eng.lock:
+        eng.persisted_version = version
 
 # ---------- CSFloat ----------
 @st.cache_data(ttl=600)
@@ -266,7 +461,7 @@ def fetch_price(name):
     if not CSFLOAT_API_KEY: return None
     params = {"market_hash_name": name, "limit": 1, "type": "buy_now", "sort_by": "lowest_price"}
     try:
-        r = requests.get(CSFLOAT_API, headers=CSFLOAT_HEADERS, params=params, timeout=10)
+        r = http_client.get(CSFLOAT_API, headers=CSFLOAT_HEADERS, params=params, timeout=10, max_retries=2)
         data = r.json()
         listings = data.get("data") or data
         if not listings: return None
@@ -280,7 +475,7 @@ def fetch_icon(name):
     if not CSFLOAT_API_KEY: return None
     params = {"market_hash_name": name, "limit": 1, "expand": "item", "sort_by": "lowest_price"}
     try:
-        r = requests.get(CSFLOAT_API, headers=CSFLOAT_HEADERS, params=params, timeout=15)
+        r = http_client.get(CSFLOAT_API, headers=CSFLOAT_HEADERS, params=params, timeout=15, max_retries=2)
         if r.status_code != 200: return None
         data = r.json()
         listings = data.get("data") or data
@@ -352,20 +547,89 @@ def ensure_price_usd(df: pd.DataFrame) -> pd.DataFrame:
 
     return out
 
-def load_price_history_df() -> pd.DataFrame:
-    text, _sha, status = gh_get_file(PATH_HISTORY)
-    if status != 200 or not str(text).strip():
+def load_price_history_parquet(start=None, end=None, columns=("price_cents",)) -> pd.DataFrame:
+    """
+    Lecture du dataset Parquet via GitHub : seules les partitions (mois) et colonnes utiles sont lues.
+    Rerun sans changement : listing en 304 ; dataset absent (cas par défaut) : pas redemandé avant LIST_MISSING_TTL.
+    """
+    if not history_store.available() or history_store.HISTORY_PARQUET in ("0", "false", "no", "off"):
+        return pd.DataFrame()
+    entries = gh_list_dir(PATH_HISTORY_PARQUET, missing_ttl=LIST_MISSING_TTL)
+    months = [e["name"][len(history_store.PARTITION_PREFIX):] for e in entries
+              if e.get("type") == "dir" and e.get("name", "").startswith(history_store.PARTITION_PREFIX)]
+    frames = []
+    for month in history_store.prune_months(sorted(months), start, end):
+        part_path = f"{PATH_HISTORY_PARQUET}/{history_store.PARTITION_PREFIX}{month}/{history_store.PARTITION_FILE}"
+        cols = list(columns) if columns else None
+        part, status = gh_get_raw_parsed(part_path, lambda blob: history_store.read_partition(blob, cols),
+                                         key=(part_path, tuple(cols or ())))
+        if status == 200 and part is not None:
+            frames.append(part)
+    if not frames:
+        return pd.DataFrame()
+    return history_store.to_history_frame(pd.concat(frames, ignore_index=True))
+
+def _parse_csv_blob(blob, **kwargs) -> pd.DataFrame:
+    if not blob or not blob.strip():
         return pd.DataFrame()
     try:
-        df = pd.read_csv(io.StringIO(text))
+        return pd.read_csv(io.BytesIO(blob), **kwargs)
     except Exception:
         return pd.DataFrame()
 
-    df = ensure_price_usd(df)
+def history_schema_version() -> int:
+    """Version du schéma de price_history.csv (sidecar, raw + ETag) ; 1 si absent."""
+    text, status = gh_get_raw_parsed(PATH_HISTORY_SCHEMA, lambda b: b.decode("utf-8", errors="replace"))
+    return history_store.parse_schema_version(text) if status == 200 else 1
+
+def load_price_history_df(start=None, end=None) -> pd.DataFrame:
+    df = load_price_history_parquet(start, end)
+    if not df.empty:
+        return df  # déjà canonique (cents entiers) : pas besoin de ensure_price_usd
+
+    # raw + ETag + Range : un rerun sans nouveau commit ne coûte qu'un 304, après un run du robot
+    # seules les lignes ajoutées sont téléchargées et parsées (et importées en base en SQLite)
+    ingest = (lambda rows: STORE.ingest_price_ticks(rows, history_schema_version())) if STORE.supports_ticks else None
+    parsed, status = gh_get_csv_tail(PATH_HISTORY, ingest)
+    if STORE.supports_ticks:
+        if parsed is not None and not parsed.empty and not STORE.has_ticks():
+            ingest(parsed)  # base recréée alors que le CSV était déjà en cache
+        ticks = STORE.load_price_ticks(start, end)  # requête indexée (market_hash_name, ts)
+        if not ticks.empty:
+            return ticks
+    if status != 200 or parsed is None or parsed.empty:
+        return pd.DataFrame()
+    df = parsed.copy()  # l'objet en cache est partagé : on ne le modifie jamais
+
+    if history_schema_version() >= 2 and "price_cents" in df.columns:
+        # schéma v2 : price_cents est toujours en cents entiers, pas d'heuristique
+        df["price_usd"] = pd.to_numeric(df["price_cents"], errors="coerce") / 100.0
+    else:
+        df = ensure_price_usd(df)
     if "ts_utc" not in df.columns or "market_hash_name" not in df.columns or "price_usd" not in df.columns:
         return pd.DataFrame()
     return df
 
+def load_daily_bars_df() -> pd.DataFrame:
+    bars, status = gh_get_raw_parsed(PATH_BARS, lambda b: _parse_csv_blob(b, dtype={"date": str}))
+    if status != 200 or bars is None:
+        return pd.DataFrame()
+    return bars.copy()
+
+def merge_bars_into_history(hist_df: pd.DataFrame, bars_df: pd.DataFrame) -> pd.DataFrame:
+    """Complète les ticks bruts (fenêtre de rétention) par les barres journalières pour les jours plus anciens."""
+    if bars_df.empty:
+        return hist_df
+    old = bars_to_ticks(bars_df)
+    if hist_df.empty or "ts_utc" not in hist_df.columns:
+        return old
+    h = hist_df.copy()
+    h["ts_utc"] = pd.to_datetime(h["ts_utc"], errors="coerce", utc=True)
+    first_raw_day = h["ts_utc"].min().floor("D") if h["ts_utc"].notna().any() else None
+    if first_raw_day is not None:
+        old = old[old["ts_utc"] < first_raw_day]
+    return pd.concat([old, h], ignore_index=True)
+
 def _normalize_history_df(hist_df: pd.DataFrame) -> pd.DataFrame:
     df = hist_df.copy()
     if "ts_utc" not in df.columns:
@@ -379,54 +643,39 @@ def _normalize_history_df(hist_df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 def build_portfolio_timeseries(trades_df: pd.DataFrame, hist_df: pd.DataFrame) -> pd.DataFrame:
+    """Valeur quotidienne du portefeuille, calculée par événements (cf. valuation.py)."""
     if trades_df.empty or hist_df.empty:
         return pd.DataFrame()
-
-    # Trades -> quantités nettes par date/item
-    t = trades_df.copy()
-    t["date"] = pd.to_datetime(t["date"], errors="coerce")
-    t = t.dropna(subset=["date","market_hash_name","qty"])
-    t["type"] = t["type"].astype(str).str.upper()
-    t["signed_qty"] = np.where(t["type"]=="BUY", t["qty"], -t["qty"])
-    t_daily = t.groupby(["date","market_hash_name"], as_index=False)["signed_qty"].sum()
-
-    # Historique des prix -> dernier prix du jour + ffill
     h = _normalize_history_df(hist_df)
     if "ts_utc" not in h.columns or "market_hash_name" not in h.columns or "price_usd" not in h.columns:
         return pd.DataFrame()
+    return valuation.portfolio_value(valuation.daily_trade_deltas(trades_df), valuation.daily_last_prices(h))
 
-    h["ts_utc"] = pd.to_datetime(h["ts_utc"], errors="coerce")
-    h = h.dropna(subset=["ts_utc","market_hash_name","price_usd"])
-    try:
-        h["ts_utc"] = h["ts_utc"].dt.tz_localize(None)
-    except Exception:
-        pass
-    h["date"] = h["ts_utc"].dt.floor("D")
-    h = h.sort_values(["market_hash_name","date","ts_utc"])
-    h_daily = h.groupby(["market_hash_name","date"], as_index=False).tail(1)[["market_hash_name","date","price_usd"]]
-
-    if h_daily.empty or t_daily.empty:
-        return pd.DataFrame()
-
-    start = min(h_daily["date"].min(), t_daily["date"].min())
-    end   = max(h_daily["date"].max(), pd.Timestamp.today().normalize())
-    if pd.isna(start) or pd.isna(end) or start > end:
-        return pd.DataFrame()
-    dates = pd.date_range(start, end, freq="D")
-
-    pos = (t_daily.pivot(index="date", columns="market_hash_name", values="signed_qty")
-           .fillna(0.0).reindex(dates).fillna(0.0).cumsum())
-    prices = (h_daily.pivot(index="date", columns="market_hash_name", values="price_usd")
-              .reindex(dates).ffill())
-
-    common = pos.columns.intersection(prices.columns)
-    if len(common) == 0:
-        return pd.DataFrame()
+# ---------- Série de valeur matérialisée ----------
+def load_portfolio_value() -> pd.DataFrame:
+    """portfolio_value.csv tel que maintenu par le robot : GitHub (raw + ETag), sinon la copie locale (lecture seule)."""
+    if GH_PAT and OWNER:
+        series, status = gh_get_raw_parsed(PATH_VALUE, valuation.parse_series)
+        if status == 200 and series is not None:
+            return series
+    return valuation.read_series(PATH_VALUE)
+
+def mark_portfolio_value_dirty(since):
+    """Après un ajout / une suppression de trade : date notée seulement, le robot recalcule à partir de `since`."""
+    path = valuation.mark_dirty(DATA_DIR, since)
+    if GH_PAT and OWNER:
+        _push_queue().enqueue([path], f"portfolio value dirty since {pd.Timestamp(since):%Y-%m-%d}")
 
-    total_value = (pos[common] * prices[common]).sum(axis=1).rename("total_value_usd").to_frame()
-    total_value.index.name = "date"
-    total_value.reset_index(inplace=True)
-    return total_value
+def portfolio_value_pending_since():
+    """Plus ancienne date notée par l'app que le robot n'a pas encore recalculée (None si à jour)."""
+    meta = None
+    if GH_PAT and OWNER:
+        meta, status = gh_get_raw_parsed(PATH_VALUE_META, valuation.parse_meta)
+        if status != 200:
+            meta = None
+    if meta is None:
+        meta = valuation.read_meta(DATA_DIR)
+    return valuation.pending_since(valuation.read_dirty(DATA_DIR), meta)
 
 # ---------- Calculs "live" holdings + KPIs ----------
 def enrich_holdings_live(holdings_df: pd.DataFrame):
@@ -454,6 +703,18 @@ def enrich_holdings_live(holdings_df: pd.DataFrame):
     return df, totals
 
 # ---------- Calculs financiers globaux ----------
+@st.cache_resource
+def _finance_book(data_dir):
+    """Séries cumulées des mouvements et des trades par profil, gardées entre les reruns (cf. cashflow.py)."""
+    return cashflow.FinanceBook()
+
+def finance_read(finance_df: pd.DataFrame, trades_df: pd.DataFrame, read):
+    """read(séries) après sync, sous le verrou du FinanceBook partagé entre sessions."""
+    book = _finance_book(DATA_DIR)
+    with book.lock:
+        book.sync(finance_df, trades_df)
+        return read(book)
+
 def compute_financials(trades_df: pd.DataFrame, finance_df: pd.DataFrame, snap_df: pd.DataFrame, baseline_df: pd.DataFrame):
     baseline_df = baseline_df.copy()
     if not baseline_df.empty:
@@ -469,35 +730,15 @@ def compute_financials(trades_df: pd.DataFrame, finance_df: pd.DataFrame, snap_d
     snapshot_bal = float(snap_df["balance_usd"].iloc[-1]) if not snap_df.empty else 0.0
     snapshot_date = snap_df["snapshot_date"].iloc[-1] if not snap_df.empty else None
 
-    td = trades_df.copy()
-    td["date"] = pd.to_datetime(td["date"], errors="coerce")
-    if snapshot_date is not None:
-        td = td[td["date"] >= snapshot_date]
-    buys_usd  = (td[td["type"]=="BUY"]["qty"]  * td[td["type"]=="BUY"]["price_usd"]).sum()
-    sells_usd = (td[td["type"]=="SELL"]["qty"] * td[td["type"]=="SELL"]["price_usd"]).sum()
-
-    fin = finance_df.copy()
-    if not fin.empty:
-        fin["date"] = pd.to_datetime(fin["date"], errors="coerce")
-
-    def _mov_sum(df):
-        if df.empty: return 0.0
-        return df.apply(lambda r: r["amount_usd"] if r.get("type")=="DEPOSIT" else (-r["amount_usd"] if r.get("type")=="WITHDRAW" else 0.0), axis=1).sum()
-
-    mov_all   = _mov_sum(fin) if not fin.empty else 0.0
-    mov_since = _mov_sum(fin[fin["date"] >= snapshot_date]) if (snapshot_date is not None and not fin.empty) else mov_all
+    buys_usd, sells_usd, mov_all, mov_since = finance_read(finance_df, trades_df, lambda book: (
+        book.buys_since(snapshot_date), book.sells_since(snapshot_date),
+        book.movements.total, book.movements_since(snapshot_date)))
 
     net_deposited_all = float(baseline_val + mov_all)
     net_deposited_since = float(mov_since)
     csfloat_cash_expected = float(snapshot_bal + net_deposited_since + sells_usd - buys_usd)
 
-    pnl_real = 0.0
-    for _, row in trades_df[trades_df["type"]=="SELL"].iterrows():
-        name = row["market_hash_name"]; qty_s = row["qty"]; price_s = row["price_usd"]
-        sub = trades_df[(trades_df["market_hash_name"]==name)&(trades_df["type"]=="BUY")]
-        cost = (sub["qty"]*sub["price_usd"]).sum(); q = sub["qty"].sum()
-        pru = cost/q if q>0 else 0.0
-        pnl_real += (price_s - pru)*qty_s
+    pnl_real = ledger_read(trades_df, lambda eng: eng.realized_pnl())
 
     return {
         "baseline_val": float(baseline_val),
@@ -527,10 +768,22 @@ with st.sidebar:
                 st.success("Workflow GitHub déclenché.")
             else:
                 st.error(f"Échec ({resp.status_code}) : {resp.text[:200]}")
+    if GH_PAT and OWNER:
+        q = _push_queue().snapshot()
+        if q["pushing"]:
+            st.caption(f"Sync GitHub : envoi en cours ({q['pending']} sauvegarde(s))…")
+        elif q["last_error"]:
+            retry = max(0, int((q["retry_at"] or time.time()) - time.time()))
+            st.warning(f"Sync GitHub : {q['pending']} sauvegarde(s) en attente — {q['last_error']} (nouvel essai dans {retry}s)")
+        elif q["pending"]:
+            st.caption(f"Sync GitHub : {q['pending']} sauvegarde(s) en attente")
+        elif q["last_push"]:
+            st.caption(f"Sync GitHub : à jour ({datetime.fromtimestamp(q['last_push']).strftime('%H:%M:%S')})")
 
 # ---------- Data chargées en amont ----------
 trades = load_trades()
 holdings_base = rebuild_holdings(trades)
+persist_holdings(trades)
 holdings_live, totals = enrich_holdings_live(holdings_base)
 total_val  = totals["total_val"]
 total_cost = totals["total_cost"]
@@ -603,8 +856,15 @@ with tab1:
 
         # Courbe d'évolution
         st.markdown("### Évolution de la valeur du portefeuille")
-        hist_df = load_price_history_df()
-        ts = build_portfolio_timeseries(trades_df=trades, hist_df=hist_df)
+        ts = load_portfolio_value()
+        if ts.empty:
+            # pas encore de série matérialisée : calculée pour l'affichage seulement, le robot écrit le fichier
+            hist_df = merge_bars_into_history(load_price_history_df(), load_daily_bars_df())
+            ts = build_portfolio_timeseries(trades_df=trades, hist_df=hist_df)
+        else:
+            pending = portfolio_value_pending_since()
+            if pending is not None:
+                st.caption(f"Transactions modifiées : courbe recalculée à partir du {pending:%d/%m/%Y} au prochain run du robot.")
         if ts.empty:
             st.info("Pas assez d’historique ou colonnes manquantes dans price_history.csv.")
         else:
@@ -631,51 +891,19 @@ with tab2:
                 "price_usd": price, "note": note, "trade_id": "trd_" + uuid.uuid4().hex[:8]
             }])
             trades = pd.concat([trades, new_trade], ignore_index=True)
-            save_trades(trades, f"add {t_type} {name}")
 
-            # >>> Rebuild & push holdings.csv (IMPORTANT)
+            # >>> Une ligne de trade + holdings.csv recalculé, dans un seul lot / un seul commit (IMPORTANT)
             holdings_now = rebuild_holdings(trades)
-            save_holdings(holdings_now, f"rebuild holdings after {t_type} {name}")
+            commit_tables(f"add {t_type} {name} (+ rebuild holdings)",
+                          insert={"trades": new_trade}, replace={"holdings": holdings_now})
+            mark_portfolio_value_dirty(new_trade["date"].iloc[0])
 
             st.success("Transaction enregistrée."); st.cache_data.clear(); st.rerun()
 
 # ---------- Onglet 3 : Transactions ----------
 def compute_trade_history_table(trades_df: pd.DataFrame) -> pd.DataFrame:
-    if trades_df.empty:
-        return pd.DataFrame(columns=["type","market_hash_name","qty","buy_price_usd","sell_price_usd","pnl_value_usd","pnl_pct","date","trade_id"])
-
-    df = trades_df.copy()
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.sort_values(["market_hash_name","date","trade_id"]).reset_index(drop=True)
-
-    out_rows = []
-    for name, g in df.groupby("market_hash_name", sort=False):
-        pos = 0.0
-        avg_cost = 0.0
-        for _, r in g.iterrows():
-            ttype = str(r["type"]).upper()
-            qty   = float(r["qty"])
-            price = float(r["price_usd"])
-            tid   = r.get("trade_id")
-
-            if ttype == "BUY":
-                total_cost_before = avg_cost * pos
-                pos_new = pos + qty
-                avg_cost = (total_cost_before + price * qty) / pos_new if pos_new > 0 else 0.0
-                pos = pos_new
-                out_rows.append({"type":"BUY","market_hash_name":name,"qty":qty,"buy_price_usd":price,"sell_price_usd":None,"pnl_value_usd":None,"pnl_pct":None,"date":r["date"],"trade_id":tid})
-
-            elif ttype == "SELL":
-                buy_price_used = avg_cost
-                pnl_val = (price - buy_price_used) * qty
-                pnl_pct = (pnl_val / (buy_price_used * qty) * 100.0) if buy_price_used > 0 else None
-                out_rows.append({"type":"SELL","market_hash_name":name,"qty":qty,"buy_price_usd":buy_price_used,"sell_price_usd":price,"pnl_value_usd":pnl_val,"pnl_pct":pnl_pct,"date":r["date"],"trade_id":tid})
-                pos = max(0.0, pos - qty)
-
-    hist = pd.DataFrame(out_rows)
-    if not hist.empty:
-        hist = hist.sort_values("date", ascending=False).reset_index(drop=True)
-    return hist
+    """Historique par trade (prix d'achat retenu, P&L des ventes) selon COST_METHOD, cf. ledger.py."""
+    return ledger_read(trades_df, lambda eng: eng.trade_history())
 
 with tab3:
     st.subheader("Historique")
@@ -721,11 +949,11 @@ with tab3:
         if st.button("Supprimer", key="btn_delete_trade"):
             if delete_id in trades["trade_id"].astype(str).values:
                 new_trades = trades[trades["trade_id"].astype(str) != delete_id]
-                save_trades(new_trades, f"delete trade {delete_id}")
-
-                # >>> Rebuild & push holdings.csv après suppression
+                # >>> Rebuild holdings.csv après suppression, même lot / même commit que la ligne supprimée
                 holdings_now = rebuild_holdings(new_trades)
-                save_holdings(holdings_now, f"rebuild holdings after delete {delete_id}")
+                commit_tables(f"delete trade {delete_id} (+ rebuild holdings)",
+                              delete={"trades": [delete_id]}, replace={"holdings": holdings_now})
+                mark_portfolio_value_dirty(trades.loc[trades["trade_id"].astype(str) == delete_id, "date"].iloc[0])
 
                 st.success(f"Transaction {delete_id} supprimée.")
                 st.cache_data.clear()
@@ -765,24 +993,14 @@ with tab4:
         base_val  = bcol2.number_input("Nouvelle baseline (USD)", min_value=0.0, step=0.01, key="baseline_value")
         base_note = bcol3.text_input("Note (optionnel)", key="baseline_note")
         if st.button("Enregistrer la baseline", key="btn_save_baseline"):
-            df = fin_base.copy()
             row = {"baseline_date": pd.to_datetime(base_date).strftime("%Y-%m-%d"),"baseline_net_deposited_usd": base_val,"note": base_note}
-            df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-            save_finance_baseline(df, "update baseline net deposited")
+            commit_tables("update baseline net deposited", insert={"finance_baseline": pd.DataFrame([row])})
             st.success("Baseline enregistrée."); st.rerun()
 
         if st.button("Baseliner sur les mouvements actuels", key="btn_baseline_autoset"):
-            if finances.empty:
-                new_val = 0.0
-            else:
-                finances["date"] = pd.to_datetime(finances["date"], errors="coerce")
-                def _mov_sum(df):
-                    return df.apply(lambda r: r["amount_usd"] if r["type"]=="DEPOSIT" else (-r["amount_usd"] if r["type"]=="WITHDRAW" else 0.0), axis=1).sum()
-                new_val = float(_mov_sum(finances))
-            df = fin_base.copy()
+            new_val = finance_read(finances, trades, lambda book: book.movements.total)
             row = {"baseline_date": date.today().strftime("%Y-%m-%d"),"baseline_net_deposited_usd": new_val,"note": "baseline = somme mouvements actuels"}
-            df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-            save_finance_baseline(df, "baseline set to current movements sum")
+            commit_tables("baseline set to current movements sum", insert={"finance_baseline": pd.DataFrame([row])})
             st.success(f"Baseline mise à ${new_val:,.2f}."); st.rerun()
 
     st.markdown('<div class="section-gap"></div>', unsafe_allow_html=True)
@@ -792,9 +1010,8 @@ with tab4:
         snap_date = colA.date_input("Date du snapshot", value=date.today(), key="snap_date")
         snap_bal  = colB.number_input("Solde CSFloat constaté (USD)", min_value=0.0, step=0.01, key="snap_balance")
         if st.button("Enregistrer le snapshot CSFloat", key="btn_save_snapshot"):
-            df = load_csfloat_snapshot()
-            df = pd.concat([df, pd.DataFrame([{"snapshot_date": pd.to_datetime(snap_date).strftime("%Y-%m-%d"),"balance_usd": snap_bal}])], ignore_index=True)
-            save_csfloat_snapshot(df, "add csfloat snapshot")
+            row = {"snapshot_date": pd.to_datetime(snap_date).strftime("%Y-%m-%d"),"balance_usd": snap_bal}
+            commit_tables("add csfloat snapshot", insert={"csfloat_snapshot": pd.DataFrame([row])})
             st.success("Snapshot CSFloat enregistré."); st.rerun()
 
     st.markdown('<div class="section-gap"></div>', unsafe_allow_html=True)
@@ -810,8 +1027,7 @@ with tab4:
                 st.error("Montant invalide.")
             else:
                 new_fin = pd.DataFrame([{"date": pd.to_datetime(f_date).strftime("%Y-%m-%d"),"type": f_type,"amount_usd": f_amt,"note": f_note,"finance_id": "fin_" + uuid.uuid4().hex[:8]}])
-                finances = pd.concat([finances, new_fin], ignore_index=True)
-                save_finances(finances, f"add {f_type} {f_amt}")
+                commit_tables(f"add {f_type} {f_amt}", insert={"finances": new_fin})
                 st.success("Mouvement enregistré."); st.rerun()
 
     st.markdown('<div class="section-gap"></div>', unsafe_allow_html=True)
@@ -839,8 +1055,7 @@ with tab4:
         del_id = st.text_input("ID de mouvement à supprimer (finance_id)", key="delete_finance_id")
         if st.button("Supprimer le mouvement", key="btn_delete_movement"):
             if del_id in fin_display["finance_id"].values:
-                new_finances = finances[finances["finance_id"] != del_id]
-                save_finances(new_finances, f"delete finance {del_id}")
+                commit_tables(f"delete finance {del_id}", delete={"finances": [del_id]})
                 st.success(f"Mouvement {del_id} supprimé."); st.cache_data.clear(); st.rerun()
             else:
                 st.error("ID introuvable.")
@@ -968,11 +1183,7 @@ Si ça ne marche toujours pas, essaie avec ton SteamID64 direct au lieu de la va
                                                     st.write(f"- AssetID: {asset.get('assetid')}, ClassID: {asset.get('classid')}")
                         else:
                             # Charger les holdings actuels
-                            current_holdings = pd.DataFrame()
-                            try:
-                                current_holdings = pd.read_csv(PATH_HOLDINGS)
-                            except Exception:
-                                pass
+                            current_holdings = load_holdings()
                             
                             # Détecter les nouveaux skins
                             new_skins = detect_new_skins(steam_items, current_holdings)
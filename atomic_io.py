@@ -0,0 +1,90 @@
+"""
+Atomic IO
+
+Petits utilitaires d'écriture sûre pour les CSV partagés entre le cron et les runs manuels :
+verrou consultatif (fichier .lock à côté de la cible) et réécriture atomique
+(fichier temporaire + fsync + rename).
+"""
+
+import os
+import csv
+import time
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou consultatif, on reste best-effort
+    fcntl = None
+
+LOCK_TIMEOUT = 60.0   # secondes d'attente max avant d'abandonner
+
+
+@contextlib.contextmanager
+def file_lock(path: str, timeout: float = LOCK_TIMEOUT):
+    """Verrou exclusif inter-processus sur `path` (via `path.lock`)."""
+    lock_path = path + ".lock"
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a") as fh:
+        if fcntl is not None:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"verrou {lock_path} toujours pris après {timeout:.0f}s")
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def write_text_atomic(path: str, text: str):
+    """Réécrit `path` d'un coup : un lecteur voit l'ancien ou le nouveau contenu, jamais un mélange."""
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    with contextlib.suppress(OSError):
+        dfd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+
+
+def drop_torn_tail(path: str, expected_fields: int = 0) -> bool:
+    """
+    Répare la fin d'un CSV sans saut de ligne final (run interrompu en pleine écriture) :
+    une dernière ligne complète (expected_fields champs, ou fichier d'une seule ligne) reçoit
+    son '\\n', une ligne tronquée est supprimée. True si une ligne a été supprimée.
+    """
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return False
+        step = min(size, 64 * 1024)
+        f.seek(size - step)
+        chunk = f.read(step)
+        cut = chunk.rfind(b"\n")
+        last = chunk[cut + 1:].decode("utf-8", errors="replace")
+        complete = cut < 0 and step == size  # fichier d'une seule ligne (en-tête)
+        if expected_fields and not complete:
+            complete = len(next(csv.reader([last]), [])) == expected_fields
+        if complete:
+            f.seek(0, os.SEEK_END)
+            f.write(b"\n")
+        else:
+            f.truncate(size - step + cut + 1)
+        f.flush()
+        os.fsync(f.fileno())
+    return not complete
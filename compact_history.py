@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Compact History
+
+Maintient une table dérivée de barres journalières par item (daily_bars.csv :
+open / high / low / close en cents + nb d'échantillons) et applique des paliers
+de rétention aux ticks bruts de price_history.csv.
+
+Exemple : ticks bruts gardés 30 jours, barres journalières pour toujours.
+
+L'élagage des ticks se fait par paliers : price_history.csv n'est réécrit que quand son plus
+ancien tick dépasse la rétention de RAW_PRUNE_STEP_DAYS jours (défaut 7), et il est alors coupé
+à la rétention exacte. Entre deux paliers le fichier ne fait que grandir par la fin, ce qui garde
+la lecture incrémentale de l'app (Range sur la fin du fichier) valide d'un run à l'autre.
+
+Usage:
+    python compact_history.py data/ [--raw-days 30] [--bars-days 0] [--prune-step 7]
+"""
+
+import os
+import sys
+import argparse
+import pandas as pd
+from typing import List
+
+from atomic_io import file_lock, write_text_atomic
+from history_store import SCHEMA_VERSION, normalize_frame, read_schema_version
+
+BARS_NAME = "daily_bars.csv"
+BARS_FIELDS = ["date", "market_hash_name", "open_cents", "high_cents", "low_cents", "close_cents", "samples"]
+
+RAW_RETENTION_DAYS = int(os.getenv("HISTORY_RAW_DAYS", "30"))    # 0 = ticks bruts gardés pour toujours
+BARS_RETENTION_DAYS = int(os.getenv("HISTORY_BARS_DAYS", "0"))   # 0 = barres gardées pour toujours
+RAW_PRUNE_STEP_DAYS = int(os.getenv("HISTORY_RAW_PRUNE_STEP_DAYS", "7"))  # marge avant de réécrire le début du CSV
+
+
+def bars_path(history_csv_path: str) -> str:
+    return os.path.join(os.path.dirname(history_csv_path), BARS_NAME)
+
+
+def build_daily_bars(ticks: pd.DataFrame, schema_version: int = SCHEMA_VERSION) -> pd.DataFrame:
+    """Ticks price_history (schéma `schema_version`) -> une barre OHLC par (jour UTC, item)."""
+    t = normalize_frame(ticks, schema_version)
+    if t.empty:
+        return pd.DataFrame(columns=BARS_FIELDS)
+    t["date"] = pd.to_datetime(t["ts"], unit="s", utc=True).dt.strftime("%Y-%m-%d")
+    t = t.sort_values(["market_hash_name", "date", "ts"])
+    g = t.groupby(["date", "market_hash_name"], sort=True)["price_cents"]
+    bars = g.agg(open_cents="first", high_cents="max", low_cents="min", close_cents="last", samples="count")
+    return bars.reset_index()[BARS_FIELDS]
+
+
+def bars_to_ticks(bars: pd.DataFrame) -> pd.DataFrame:
+    """Barres -> pseudo-ticks (close en fin de journée) au format price_history."""
+    if bars.empty:
+        return pd.DataFrame(columns=["ts_utc", "market_hash_name", "price_cents", "price_usd"])
+    close = pd.to_numeric(bars["close_cents"], errors="coerce")
+    return pd.DataFrame({
+        "ts_utc": pd.to_datetime(bars["date"], utc=True) + pd.Timedelta(hours=23, minutes=59, seconds=59),
+        "market_hash_name": bars["market_hash_name"].astype(str),
+        "price_cents": close,
+        "price_usd": close / 100.0,
+    })
+
+
+def read_bars(path: str) -> pd.DataFrame:
+    if not os.path.isfile(path):
+        return pd.DataFrame(columns=BARS_FIELDS)
+    try:
+        return pd.read_csv(path, dtype={"date": str})
+    except Exception as e:
+        print(f"[WARN] lecture barres {path}: {e}")
+        return pd.DataFrame(columns=BARS_FIELDS)
+
+
+def _write_atomic(df: pd.DataFrame, path: str):
+    write_text_atomic(path, df.to_csv(index=False))
+
+
+def compact(history_csv_path: str, raw_days: int = RAW_RETENTION_DAYS, bars_days: int = BARS_RETENTION_DAYS,
+            today: pd.Timestamp = None, prune_step: int = RAW_PRUNE_STEP_DAYS) -> dict:
+    """
+    Recalcule les barres des jours encore présents en brut, garde les anciennes barres,
+    puis élague les ticks / barres hors rétention (coupure alignée sur le jour UTC) ; les ticks
+    seulement quand le plus ancien a plus de raw_days + prune_step jours.
+    """
+    today = pd.Timestamp.now(tz="UTC") if today is None else pd.Timestamp(today)
+    if today.tzinfo is None:
+        today = today.tz_localize("UTC")
+    today = today.tz_convert("UTC").normalize()
+    with file_lock(history_csv_path):  # même verrou que fetch_prices.append_history
+        return _compact_locked(history_csv_path, raw_days, bars_days, today, prune_step)
+
+
+def _compact_locked(history_csv_path: str, raw_days: int, bars_days: int, today: pd.Timestamp,
+                    prune_step: int = 0) -> dict:
+    raw = pd.read_csv(history_csv_path, dtype=str, keep_default_na=False, skip_blank_lines=True)
+    fresh = build_daily_bars(raw, read_schema_version(history_csv_path))
+
+    bp = bars_path(history_csv_path)
+    old = read_bars(bp)
+    if not fresh.empty:
+        old = old[old["date"] < fresh["date"].min()]
+    bars = pd.concat([old, fresh], ignore_index=True).sort_values(["date", "market_hash_name"])
+    if bars_days > 0:
+        bars = bars[bars["date"] >= (today - pd.Timedelta(days=bars_days)).strftime("%Y-%m-%d")]
+    _write_atomic(bars, bp)
+
+    dropped = 0
+    if raw_days > 0 and not raw.empty:
+        ts = pd.to_datetime(raw["ts_utc"], errors="coerce", utc=True)
+        keep = ts.isna() | (ts >= today - pd.Timedelta(days=raw_days))
+        due = ts.notna().any() and ts.min() < today - pd.Timedelta(days=raw_days + max(prune_step, 0))
+        dropped = int((~keep).sum()) if due else 0
+        if dropped:
+            _write_atomic(raw[keep], history_csv_path)
+
+    return {"bars": len(bars), "bars_recomputed": len(fresh), "ticks_dropped": dropped, "ticks_kept": len(raw) - dropped}
+
+
+def _history_paths(paths: List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            direct = os.path.join(p, "price_history.csv")
+            if os.path.isfile(direct):
+                out.append(direct)
+                continue
+            for sub in sorted(os.listdir(p)):
+                cand = os.path.join(p, sub, "price_history.csv")
+                if os.path.isfile(cand):
+                    out.append(cand)
+        elif os.path.isfile(p):
+            out.append(p)
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description="Barres journalières + rétention des ticks de price_history.csv")
+    p.add_argument("paths", nargs="+", help="price_history.csv, dossier data/<profil> ou racine data/")
+    p.add_argument("--raw-days", type=int, default=RAW_RETENTION_DAYS, help="jours de ticks bruts gardés, 0 = tous (défaut: %(default)s)")
+    p.add_argument("--bars-days", type=int, default=BARS_RETENTION_DAYS, help="jours de barres gardés, 0 = toutes (défaut: %(default)s)")
+    p.add_argument("--prune-step", type=int, default=RAW_PRUNE_STEP_DAYS,
+                   help="jours de dépassement avant de réécrire price_history.csv (défaut: %(default)s)")
+    args = p.parse_args()
+
+    paths = _history_paths(args.paths)
+    if not paths:
+        print(f"[WARN] aucun price_history.csv trouvé dans {args.paths}")
+        sys.exit(0)
+    for path in paths:
+        res = compact(path, args.raw_days, args.bars_days, prune_step=args.prune_step)
+        print(f"[COMPACT] {path}: {res['bars']} barres ({res['bars_recomputed']} recalculées), "
+              f"{res['ticks_dropped']} ticks élagués, {res['ticks_kept']} gardés")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,62 @@
 #!/usr/bin/env python3
-import os, sys, csv, time, datetime, requests, pandas as pd
+import os, sys, csv, json, time, datetime, argparse, threading, pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Tuple, List
+import http_client
+import history_store
+import valuation
+from atomic_io import file_lock, write_text_atomic, drop_torn_tail
+from fetch_scheduler import plan_fetch, read_history_tail
 
 CSFLOAT_API_KEY = os.getenv("CSFLOAT_API_KEY", "").strip()
-CSFLOAT_API = "https://csfloat.com/api/v1/listings"
+CSFLOAT_API_BASE = os.getenv("CSFLOAT_API_BASE", "https://csfloat.com").rstrip("/")  # stub local : stub_server.py
+CSFLOAT_API = f"{CSFLOAT_API_BASE}/api/v1/listings"
 HEADERS = {"Authorization": CSFLOAT_API_KEY} if CSFLOAT_API_KEY else {}
 
 ALLOW_FALLBACK_ALL_TYPES = True   # si buy_now vide, on réessaie sans 'type'
-SLEEP_BETWEEN_CALLS = 0.3         # petite pause anti rate-limit
+
+# Mode top-K : un seul appel (limit=K, tous types) dont on dérive toutes les stats
+TOP_K = int(os.getenv("CSFLOAT_TOP_K", "20"))   # 0 = ancien mode (buy_now limit=1 + fallback)
+TRIM_RATIO = 0.1                                # part coupée de chaque côté pour la médiane
+
+HISTORY_FIELDS = ["ts_utc","market_hash_name","price_cents","price_usd"]
+EXTRA_FIELDS = ["min_all_cents","median_cents","listing_count"]
+
+# Débit vers CSFloat : token-bucket partagé par tous les workers
+DEFAULT_RATE = float(os.getenv("CSFLOAT_RATE", "3"))           # requêtes / seconde
+DEFAULT_BURST = int(os.getenv("CSFLOAT_BURST", "5"))           # rafale max
+DEFAULT_CONCURRENCY = int(os.getenv("CSFLOAT_CONCURRENCY", "4"))
+
+# Écriture en streaming : les lignes sont flushées par petits lots + journal de reprise
+FLUSH_EVERY = 20
+CHECKPOINT_NAME = ".fetch_checkpoint.jsonl"
+CHECKPOINT_MAX_AGE_H = float(os.getenv("CSFLOAT_CHECKPOINT_MAX_AGE_H", "12"))  # un intervalle du cron (07:00 / 19:00)
+
+class TokenBucket:
+    """Limiteur token-bucket thread-safe : `rate` jetons/s, au plus `burst` en réserve."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(float(rate), 0.01)
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0  # nb de requêtes autorisées (stats)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    self.acquired += 1
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+LIMITER = TokenBucket(DEFAULT_RATE, DEFAULT_BURST)
 
 def read_holdings(path: str) -> pd.DataFrame:
     if not os.path.isfile(path):
@@ -43,26 +92,28 @@ def _interpret_price(raw) -> Tuple[Optional[int], Optional[float]]:
     cents = int(round(val))
     return cents, round(cents / 100.0, 2)
 
-def _fetch_once(params: dict) -> Optional[Tuple[int, float]]:
+def _get_listings(params: dict) -> Optional[list]:
+    """Annonces renvoyées par l'API ([] si aucune), None sur erreur."""
     try:
-        r = requests.get(CSFLOAT_API, headers=HEADERS, params=params, timeout=20)
-        if r.status_code == 429:
-            print("[RATE] 429; sleep 3s puis retry…")
-            time.sleep(3)
-            r = requests.get(CSFLOAT_API, headers=HEADERS, params=params, timeout=20)
+        # session keep-alive + retries (Retry-After / backoff), chaque tentative consomme un jeton
+        r = http_client.get(CSFLOAT_API, headers=HEADERS, params=params, timeout=20,
+                            before_attempt=LIMITER.acquire)
         r.raise_for_status()
         data = r.json()
-        listings = data.get("data") if isinstance(data, dict) else data
-        if not isinstance(listings, list) or not listings:
-            return None
-        raw = listings[0].get("price")
-        cents, usd = _interpret_price(raw)
-        if cents is None or usd is None:
-            return None
-        return cents, usd
     except Exception as e:
         print(f"[ERROR] API: {e}")
         return None
+    listings = data.get("data") if isinstance(data, dict) else data
+    return listings if isinstance(listings, list) else []
+
+def _fetch_once(params: dict) -> Optional[Tuple[int, float]]:
+    listings = _get_listings(params)
+    if not listings:
+        return None
+    cents, usd = _interpret_price(listings[0].get("price"))
+    if cents is None or usd is None:
+        return None
+    return cents, usd
 
 def fetch_lowest_price(name: str) -> Optional[Tuple[int, float]]:
     if not CSFLOAT_API_KEY:
@@ -83,61 +134,391 @@ def fetch_lowest_price(name: str) -> Optional[Tuple[int, float]]:
         print(f"[NO LISTING all-types] {name}")
     return None
 
+def _trimmed_median(values: List[int]) -> Optional[int]:
+    if not values:
+        return None
+    v = sorted(values)
+    k = int(len(v) * TRIM_RATIO)
+    core = v[k:len(v) - k] or v
+    mid = len(core) // 2
+    med = core[mid] if len(core) % 2 else (core[mid - 1] + core[mid]) / 2.0
+    return int(round(med))
+
+def fetch_topk_stats(name: str, k: int) -> Optional[dict]:
+    """
+    Un appel (limit=k, sans filtre 'type') -> prix min buy_now, min toutes annonces, médiane
+    tronquée et nb d'annonces. Si les k moins chères ne contiennent aucun buy_now alors que la page
+    est pleine, un second appel (type=buy_now, limit=1) cherche plus loin. Le min toutes annonces
+    ne sert de prix qu'une fois établi qu'il n'existe aucun buy_now (ALLOW_FALLBACK_ALL_TYPES) ;
+    sinon price_cents reste vide plutôt que d'enregistrer l'enchère en cours d'une vente aux enchères.
+    """
+    if not CSFLOAT_API_KEY:
+        print("[WARN] CSFLOAT_API_KEY manquant; impossible de fetch.")
+        return None
+    listings = _get_listings({"market_hash_name": name, "sort_by": "lowest_price", "limit": k})
+    if not listings:
+        if listings is not None:
+            print(f"[NO LISTING all-types] {name}")
+        return None
+
+    all_cents, buy_now_cents = [], []
+    for l in listings:
+        cents, _usd = _interpret_price(l.get("price"))
+        if cents is None:
+            continue
+        all_cents.append(cents)
+        if l.get("type") == "buy_now":
+            buy_now_cents.append(cents)
+    if not all_cents:
+        return None
+
+    cents, no_buy_now = (min(buy_now_cents), False) if buy_now_cents else (None, len(listings) < k)
+    if cents is None and not no_buy_now:
+        # page pleine d'enchères : le buy_now le moins cher est plus loin
+        more = _get_listings({"market_hash_name": name, "sort_by": "lowest_price", "limit": 1, "type": "buy_now"})
+        if more:
+            cents, _usd = _interpret_price(more[0].get("price"))
+        no_buy_now = more is not None and not more
+    if cents is None and no_buy_now:
+        if ALLOW_FALLBACK_ALL_TYPES:
+            print(f"[NO LISTING buy_now] {name} (fallback toutes annonces)")
+            cents = min(all_cents)
+        else:
+            print(f"[NO LISTING buy_now] {name}")
+    elif cents is None:
+        print(f"[WARN] {name} : buy_now introuvable au-delà des {k} premières annonces ; prix laissé vide")
+    return {
+        "price_cents": cents,
+        "price_usd": round(cents / 100.0, 2) if cents is not None else None,
+        "min_all_cents": min(all_cents),
+        "median_cents": _trimmed_median(all_cents),
+        "listing_count": len(all_cents),
+    }
+
+def _read_header(history_path: str) -> Tuple[List[str], bool]:
+    """En-tête (première ligne non vide) + True si des lignes vides le précèdent."""
+    with open(history_path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if line.strip():
+                return next(csv.reader([line])), i > 0
+    return [], False
+
 def ensure_history_file(history_path: str):
     """Crée le fichier avec l'en-tête s'il n'existe pas (même sans données)."""
     os.makedirs(os.path.dirname(history_path), exist_ok=True)
     if not os.path.isfile(history_path):
-        with open(history_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=["ts_utc","market_hash_name","price_cents","price_usd"])
-            writer.writeheader()
-        print(f"[INIT] créé {history_path} (en-tête)")
+        write_text_atomic(history_path, ",".join(HISTORY_FIELDS + EXTRA_FIELDS) + "\n")
+        history_store.write_schema(history_path)  # nouveau fichier : cents entiers dès le départ
+        print(f"[INIT] créé {history_path} (en-tête, schéma v{history_store.SCHEMA_VERSION})")
+
+def upgrade_history_header(history_path: str) -> List[str]:
+    """
+    Remet l'en-tête d'aplomb en une réécriture atomique : ajoute les colonnes EXTRA_FIELDS
+    à un ancien fichier 4 colonnes et supprime les lignes vides parasites avant l'en-tête.
+    """
+    fields, leading_blank = _read_header(history_path)
+    missing = [c for c in HISTORY_FIELDS + EXTRA_FIELDS if c not in fields]
+    if not missing and not leading_blank:
+        return fields
+    df = pd.read_csv(history_path, dtype=str, keep_default_na=False) if fields else pd.DataFrame()
+    fields = fields + missing
+    df = df.reindex(columns=fields, fill_value="")
+    write_text_atomic(history_path, df.to_csv(index=False))
+    print(f"[MIGRATE] {history_path}: en-tête réécrit (colonnes ajoutées {missing})")
+    return fields
+
+def _existing_keys(history_path: str) -> set:
+    """Index (ts_utc, market_hash_name) des lignes récentes, pour ne jamais réécrire un doublon."""
+    tail = read_history_tail(history_path)
+    if tail.empty or "ts_utc" not in tail.columns or "market_hash_name" not in tail.columns:
+        return set()
+    return set(zip(tail["ts_utc"].astype(str), tail["market_hash_name"].astype(str)))
 
 def append_history(history_path: str, rows: List[dict]):
-    ensure_history_file(history_path)
+    """
+    Append sous verrou consultatif : en-tête réparé si besoin, ligne tronquée d'un run
+    interrompu supprimée, doublons (ts_utc, market_hash_name) ignorés, puis fsync.
+    """
     if not rows:
         print("[INFO] aucune ligne à ajouter (pas de prix trouvé).")
         return
-    with open(history_path, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["ts_utc","market_hash_name","price_cents","price_usd"])
+    with file_lock(history_path):
+        ensure_history_file(history_path)
+        if drop_torn_tail(history_path, expected_fields=len(_read_header(history_path)[0])):
+            print(f"[REPAIR] {history_path}: dernière ligne tronquée supprimée")
+        fields = upgrade_history_header(history_path)
+
+        seen = _existing_keys(history_path)
+        fresh = []
         for r in rows:
-            writer.writerow(r)
-    print(f"[DONE] {len(rows)} lignes ajoutées → {history_path}")
+            key = (str(r["ts_utc"]), str(r["market_hash_name"]))
+            if key not in seen:
+                seen.add(key)
+                fresh.append(r)
+        if len(fresh) < len(rows):
+            print(f"[DEDUP] {len(rows) - len(fresh)} ligne(s) déjà présente(s) ignorée(s)")
+        if not fresh:
+            return
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python fetch_prices.py <path/to/holdings.csv>")
-        sys.exit(1)
+        with open(history_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, restval="", extrasaction="ignore", lineterminator="\n")
+            for r in fresh:
+                writer.writerow(r)
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"[DONE] {len(fresh)} lignes ajoutées → {history_path}")
+        if history_store.enabled_for(history_path):
+            n = history_store.append_rows(history_store.dataset_dir(history_path), pd.DataFrame(fresh))
+            print(f"[DONE] {n} lignes ajoutées → {history_store.dataset_dir(history_path)} (Parquet)")
+
+def iter_fetch(names: List[str], ts: str, concurrency: int = 1, top_k: int = 0):
+    """
+    Fetch concurrent (pool de threads borné) ; le débit réel est piloté par LIMITER.
+    top_k > 0 : un seul appel par item (fetch_topk_stats), sinon ancien mode 1-2 appels.
+    Produit (name, row|None) au fil de l'eau, sans rien accumuler.
+    """
+    total = len(names)
+    done = 0
+
+    def _row(name):
+        if top_k > 0:
+            stats = fetch_topk_stats(name, top_k)
+            return {"ts_utc": ts, "market_hash_name": name, **stats} if stats else None
+        got = fetch_lowest_price(name)
+        if not got:
+            return None
+        cents, usd = got
+        return {"ts_utc": ts, "market_hash_name": name, "price_cents": cents, "price_usd": usd}
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(_row, name): name for name in names}
+        for fut in as_completed(futures):
+            name = futures.pop(fut)
+            done += 1
+            row = fut.result()
+            if row and row.get("price_cents") is None:
+                print(f"[OK] {done:02d}/{total} {name} -> sans prix buy_now (min toutes annonces {row['min_all_cents']} cents)")
+            elif row:
+                print(f"[OK] {done:02d}/{total} {name} -> {row['price_cents']} cents (${row['price_usd']:.2f})")
+            else:
+                print(f"[SKIP] {done:02d}/{total} {name} (aucun prix)")
+            yield name, row
+
+class RunCheckpoint:
+    """
+    Journal JSONL d'un run : une ligne d'en-tête (ts_utc + items planifiés), puis
+    une ligne par lot d'items terminés (déjà écrits dans les price_history.csv).
+    Supprimé en fin de run réussi ; s'il existe au démarrage, le run reprend, sauf s'il a plus de
+    `max_age_h` heures (le run suivant est déjà passé : reprendre réécrirait des prix sous un vieux ts_utc).
+    """
+
+    def __init__(self, path: str, max_age_h: float = CHECKPOINT_MAX_AGE_H):
+        self.path = path
+        self.max_age_h = max_age_h
+        self.ts: Optional[str] = None
+        self.names: List[str] = []
+        self.done: set = set()
+
+    def load(self) -> bool:
+        if not os.path.isfile(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # dernière ligne tronquée par un crash
+                    if "ts_utc" in entry:
+                        self.ts, self.names = entry["ts_utc"], list(entry.get("names", []))
+                    self.done.update(entry.get("done", []))
+        except Exception as e:
+            print(f"[WARN] checkpoint illisible {self.path}: {e}")
+            return False
+        if self.ts is None:
+            return False
+        age_h = self.age_hours()
+        if age_h is None or age_h > self.max_age_h:
+            print(f"[WARN] checkpoint {self.path} du {self.ts} ignoré (> {self.max_age_h:g} h) ; nouveau run")
+            self.clear()
+            self.ts, self.names, self.done = None, [], set()
+            return False
+        return True
+
+    def age_hours(self) -> Optional[float]:
+        """Âge du run en heures (None si ts_utc illisible)."""
+        ts = pd.to_datetime(self.ts, errors="coerce", utc=True)
+        if pd.isna(ts):
+            return None
+        return (pd.Timestamp.now(tz="UTC") - ts).total_seconds() / 3600.0
+
+    def _append(self, entry: dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, ts: str, names: List[str]):
+        self.clear()
+        self.ts, self.names, self.done = ts, list(names), set()
+        self._append({"ts_utc": ts, "names": self.names})
+
+    def mark_done(self, names: List[str]):
+        self.done.update(names)
+        self._append({"done": list(names)})
+
+    def remaining(self) -> List[str]:
+        return [n for n in self.names if n not in self.done]
 
-    holdings_path = sys.argv[1]
-    base_dir = os.path.dirname(holdings_path)
-    history_path = os.path.join(base_dir, "price_history.csv")
+    def clear(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+def flush_batch(batch: List[Tuple[str, Optional[dict]]], profiles: List[Tuple[str, List[str]]],
+                ckpt: Optional[RunCheckpoint] = None) -> int:
+    """Écrit un lot dans chaque profil concerné puis le note dans le journal ; renvoie nb de prix."""
+    rows = sorted((r for _, r in batch if r), key=lambda r: r["market_hash_name"])
+    for history_path, profile_names in profiles:
+        sub = fan_out(rows, profile_names)
+        if sub:
+            append_history(history_path, sub)
+    if ckpt is not None and batch:
+        ckpt.mark_done([name for name, _ in batch])
+    return len(rows)
+
+def resolve_holdings_paths(paths: List[str]) -> List[str]:
+    """Accepte des holdings.csv, des dossiers de profil (data/<profil>) ou la racine data/."""
+    found: List[str] = []
+    for p in paths:
+        if os.path.isdir(p):
+            direct = os.path.join(p, "holdings.csv")
+            if os.path.isfile(direct):
+                found.append(direct)
+                continue
+            for sub in sorted(os.listdir(p)):
+                cand = os.path.join(p, sub, "holdings.csv")
+                if os.path.isfile(cand):
+                    found.append(cand)
+        else:
+            found.append(p)
+    # dédoublonnage en gardant l'ordre
+    out, seen = [], set()
+    for p in found:
+        key = os.path.abspath(p)
+        if key not in seen:
+            seen.add(key)
+            out.append(p)
+    return out
+
+def fan_out(rows: List[dict], names: List[str]) -> List[dict]:
+    """Sous-ensemble des lignes fetchées qui concernent un profil (copies indépendantes)."""
+    wanted = set(names)
+    return [dict(r) for r in rows if r["market_hash_name"] in wanted]
+
+def update_value_series(holdings_paths: List[str]):
+    """Un point par run dans data/<profil>/portfolio_value.csv (cf. valuation.py)."""
+    for holdings_path in holdings_paths:
+        profile_dir = os.path.dirname(holdings_path) or "."
+        try:
+            series = valuation.update_profile(profile_dir)
+        except Exception as e:
+            print(f"[WARN] portfolio_value {profile_dir}: {e}")
+            continue
+        if not series.empty:
+            print(f"[VALUE] {profile_dir}: {series['total_value_usd'].iloc[-1]:.2f} USD au {series['date'].iloc[-1]:%Y-%m-%d}")
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Fetch des prix CSFloat → price_history.csv (un ou plusieurs profils)")
+    p.add_argument("paths", nargs="+", help="holdings.csv, dossier data/<profil> ou racine data/ (plusieurs possibles)")
+    p.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="nb de requêtes en vol (défaut: %(default)s)")
+    p.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requêtes/seconde max (défaut: %(default)s)")
+    p.add_argument("--burst", type=int, default=DEFAULT_BURST, help="rafale max du token-bucket (défaut: %(default)s)")
+    p.add_argument("--top-k", type=int, default=TOP_K,
+                   help="annonces lues en un seul appel par item, 0 = ancien mode buy_now + fallback (défaut: %(default)s)")
+    p.add_argument("--budget", type=int, default=int(os.getenv("CSFLOAT_BUDGET", "0")),
+                   help="nb max d'items fetchés par run, 0 = illimité (défaut: %(default)s)")
+    p.add_argument("--all", action="store_true", help="ignorer le planificateur et tout re-fetcher")
+    p.add_argument("--checkpoint", default=None,
+                   help=f"journal de reprise (défaut: <dossier commun>/{CHECKPOINT_NAME})")
+    p.add_argument("--no-resume", action="store_true", help="ignorer un checkpoint existant et repartir de zéro")
+    return p.parse_args(argv)
+
+def main():
+    global LIMITER
+    args = parse_args()
 
     if not CSFLOAT_API_KEY:
         print("[FATAL] CSFLOAT_API_KEY manquant (secret GitHub).")
         sys.exit(1)
 
-    df = read_holdings(holdings_path)
-    if df.empty:
-        print("[INFO] holdings vide; on crée quand même price_history.csv (en-tête).")
-        ensure_history_file(history_path)
+    holdings_paths = resolve_holdings_paths(args.paths)
+    if not holdings_paths:
+        print(f"[FATAL] aucun holdings.csv trouvé dans {args.paths}")
+        sys.exit(1)
+
+    # profil -> (price_history.csv, items détenus)
+    profiles: List[Tuple[str, List[str]]] = []
+    qty_by_name: dict = {}
+    for holdings_path in holdings_paths:
+        history_path = os.path.join(os.path.dirname(holdings_path), "price_history.csv")
+        df = read_holdings(holdings_path)
+        if df.empty:
+            print(f"[INFO] holdings vide ({holdings_path}); on crée quand même price_history.csv (en-tête).")
+            ensure_history_file(history_path)
+            continue
+        profiles.append((history_path, sorted(df["market_hash_name"].dropna().unique().tolist())))
+        qty = pd.to_numeric(df["qty"], errors="coerce").fillna(1).groupby(df["market_hash_name"]).sum()
+        for name, q in qty.items():
+            qty_by_name[name] = qty_by_name.get(name, 0.0) + float(q)
+
+    names = sorted({n for _, profile_names in profiles for n in profile_names})
+    if not names:
+        update_value_series(holdings_paths)
         sys.exit(0)
+    per_profile = sum(len(n) for _, n in profiles)
+    print(f"[INFO] {len(names)} items uniques à traiter pour {len(profiles)} profil(s) "
+          f"({per_profile - len(names)} appels évités par dédoublonnage) "
+          f"(concurrency={args.concurrency}, rate={args.rate}/s, burst={args.burst})")
 
-    names = sorted(df["market_hash_name"].dropna().unique().tolist())
-    print(f"[INFO] {len(names)} items à traiter depuis {holdings_path}")
+    ckpt_path = args.checkpoint or os.path.join(
+        os.path.commonpath([os.path.abspath(os.path.dirname(h)) for h, _ in profiles]), CHECKPOINT_NAME)
+    ckpt = RunCheckpoint(ckpt_path)
+    if args.no_resume:
+        ckpt.clear()
 
-    ts = datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
-    out: List[dict] = []
-    for i, name in enumerate(names, 1):
-        got = fetch_lowest_price(name)
-        if got:
-            cents, usd = got
-            out.append({"ts_utc": ts, "market_hash_name": name, "price_cents": cents, "price_usd": usd})
-            print(f"[OK] {i:02d}/{len(names)} {name} -> {cents} cents (${usd:.2f})")
-        else:
-            print(f"[SKIP] {i:02d}/{len(names)} {name} (aucun prix)")
-        time.sleep(SLEEP_BETWEEN_CALLS)
+    if ckpt.load():
+        # reprise d'un run interrompu : même ts_utc, items déjà écrits sautés
+        ts = ckpt.ts
+        names = ckpt.remaining()
+        print(f"[RESUME] run {ts} : {len(ckpt.done)} items déjà faits, {len(names)} restants ({ckpt_path})")
+    else:
+        if not args.all:
+            names = plan_fetch(names, [h for h, _ in profiles], qty_by_name, budget=args.budget)
+            if not names:
+                print("[INFO] aucun item dû; rien à fetcher.")
+                update_value_series(holdings_paths)
+                sys.exit(0)
+        ts = datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        ckpt.start(ts, names)
+
+    LIMITER = TokenBucket(args.rate, args.burst)
+    t0 = time.monotonic()
+    n_ok = 0
+    batch: List[Tuple[str, Optional[dict]]] = []
+    for name, row in iter_fetch(names, ts, concurrency=args.concurrency, top_k=args.top_k):
+        batch.append((name, row))
+        if len(batch) >= FLUSH_EVERY:
+            n_ok += flush_batch(batch, profiles, ckpt)
+            batch = []
+    n_ok += flush_batch(batch, profiles, ckpt)
+    elapsed = max(time.monotonic() - t0, 1e-9)
+    ckpt.clear()
 
-    append_history(history_path, out)
+    print(f"[STATS] {len(names)} items ({n_ok} prix, {len(names) - n_ok} skip) en {elapsed:.1f}s — "
+          f"{LIMITER.acquired} requêtes, {LIMITER.acquired / elapsed:.2f} req/s, {len(names) / elapsed:.2f} items/s")
+    update_value_series(holdings_paths)
 
 if __name__ == "__main__":
     main()
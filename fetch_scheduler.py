@@ -0,0 +1,123 @@
+"""
+Fetch Scheduler
+
+Planification incrémentale des fetchs CSFloat : chaque item reçoit une
+échéance (next-due) calculée depuis la queue de price_history.csv.
+Les items volatils ou de forte valeur sont re-fetchés souvent, les items
+stables et bon marché rarement, dans la limite d'un budget de requêtes par run.
+"""
+
+import io
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+TAIL_BYTES = 256 * 1024          # on ne lit que la fin de l'historique
+SAMPLES_FOR_VOL = 10             # nb de derniers points pour la volatilité
+
+MIN_INTERVAL_H = 11.0            # cron toutes les 12h : marge pour ne pas rater un run
+MAX_INTERVAL_H = 24.0 * 7        # un item stable est quand même revu chaque semaine
+VOL_REF = 0.05                   # 5% de variation moyenne entre points = urgence max
+VALUE_REF_USD = 50.0             # position >= 50$ = urgence max
+
+
+def read_history_tail(history_path: str, max_bytes: int = TAIL_BYTES) -> pd.DataFrame:
+    """
+    Lire uniquement la fin de price_history.csv (en-tête + dernières lignes complètes).
+
+    Returns:
+        DataFrame (éventuellement vide) avec les colonnes de l'en-tête du fichier
+    """
+    if not os.path.isfile(history_path):
+        return pd.DataFrame()
+    try:
+        with open(history_path, "rb") as f:
+            header = b""
+            while not header.strip():
+                header = f.readline()
+                if not header:
+                    return pd.DataFrame()
+            body_start = f.tell()
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            start = max(body_start, size - max_bytes)
+            f.seek(start)
+            chunk = f.read()
+        if start > body_start:
+            # première ligne probablement tronquée
+            chunk = chunk.split(b"\n", 1)[1] if b"\n" in chunk else b""
+        text = (header + chunk).decode("utf-8", errors="replace")
+        return pd.read_csv(io.StringIO(text), skip_blank_lines=True)
+    except Exception as e:
+        print(f"[WARN] lecture queue historique {history_path}: {e}")
+        return pd.DataFrame()
+
+
+def _interval_hours(prices: pd.Series, qty: float) -> float:
+    """Intervalle de re-fetch (heures) selon volatilité récente et valeur de la position."""
+    p = pd.to_numeric(prices, errors="coerce").dropna().tail(SAMPLES_FOR_VOL)
+    if len(p) < 3:
+        return MIN_INTERVAL_H
+    rel = p.pct_change().abs().replace([np.inf, -np.inf], np.nan).dropna()
+    vol = float(rel.mean()) if not rel.empty else 0.0
+    value = float(p.iloc[-1]) * max(float(qty), 1.0)
+    urgency = max(min(vol / VOL_REF, 1.0), min(value / VALUE_REF_USD, 1.0))
+    return MAX_INTERVAL_H - (MAX_INTERVAL_H - MIN_INTERVAL_H) * urgency
+
+
+def plan_fetch(
+    names: List[str],
+    history_paths: List[str],
+    qty_by_name: Optional[Dict[str, float]] = None,
+    budget: int = 0,
+    now: Optional[datetime.datetime] = None,
+) -> List[str]:
+    """
+    Sélectionner les items à fetcher pour ce run.
+
+    Args:
+        names: items détenus (union des profils)
+        history_paths: price_history.csv à consulter
+        qty_by_name: quantité détenue par item (pondère la valeur)
+        budget: nb max d'items fetchés (0 = illimité)
+        now: horloge (UTC naïf), injectable pour les tests
+
+    Returns:
+        Liste des items dus, les plus en retard d'abord
+    """
+    now = now or datetime.datetime.utcnow()
+    qty_by_name = qty_by_name or {}
+
+    tails = [read_history_tail(p) for p in history_paths]
+    tails = [t for t in tails if {"ts_utc", "market_hash_name", "price_usd"}.issubset(t.columns)]
+    if tails:
+        h = pd.concat(tails, ignore_index=True)
+        h["ts_utc"] = pd.to_datetime(h["ts_utc"], errors="coerce", utc=True).dt.tz_localize(None)
+        h = (h.dropna(subset=["ts_utc", "market_hash_name"])
+              .drop_duplicates(subset=["ts_utc", "market_hash_name"])
+              .sort_values("ts_utc"))
+        groups = {name: g for name, g in h.groupby("market_hash_name")}
+    else:
+        groups = {}
+
+    scored = []
+    for name in names:
+        g = groups.get(name)
+        if g is None or g.empty:
+            scored.append((float("inf"), name))  # jamais vu : prioritaire
+            continue
+        age_h = (now - g["ts_utc"].iloc[-1].to_pydatetime()).total_seconds() / 3600.0
+        interval = _interval_hours(g["price_usd"], qty_by_name.get(name, 1.0))
+        if age_h >= interval:
+            scored.append((age_h / interval, name))
+
+    scored.sort(key=lambda x: (-x[0], x[1]))
+    due = [name for _, name in scored]
+    skipped = len(names) - len(due)
+    if budget and len(due) > budget:
+        print(f"[SCHED] {len(due)} items dus, budget {budget} : {len(due) - budget} reportés au prochain run")
+        due = due[:budget]
+    print(f"[SCHED] {len(due)}/{len(names)} items à fetcher ({skipped} encore frais)")
+    return sorted(due)
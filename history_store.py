@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+History Store
+
+Formats de l'historique des prix :
+
+1) price_history.csv canonique versionné : price_cents entier, price_usd = price_cents / 100,
+   version du schéma dans le sidecar price_history.meta.json. Un fichier en schéma >= 2
+   est lu tel quel ; l'heuristique cents/USD (canonical_cents, ensure_price_usd) ne sert
+   qu'aux fichiers schéma 1 et à leur migration (normalize).
+
+2) Backend colonnaire optionnel (Parquet), à côté du CSV :
+
+    data/<profil>/price_history/month=YYYY-MM/data.parquet
+
+- market_hash_name dictionnaire-encodé, prix en cents entiers, ts en epoch (secondes UTC)
+- un fichier par mois : lecture avec élagage des partitions (plage de dates) et des colonnes
+- nécessite pyarrow (optionnel) ; sans pyarrow, tout retombe sur le CSV
+
+Migrations :
+    python history_store.py normalize data/pierre/price_history.csv   # CSV -> cents entiers + sidecar
+    python history_store.py migrate data/pierre/price_history.csv     # CSV -> Parquet
+"""
+
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+from atomic_io import file_lock, write_text_atomic
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # backend optionnel
+    pa = None
+    pq = None
+
+DATASET_DIRNAME = "price_history"
+PARTITION_PREFIX = "month="
+PARTITION_FILE = "data.parquet"
+
+# "auto" : on écrit en Parquet seulement si le dataset existe déjà (créé par la migration)
+# "1" : toujours (crée le dataset) ; "0" : jamais
+HISTORY_PARQUET = os.getenv("HISTORY_PARQUET", "auto").strip().lower()
+
+INT_COLUMNS = ["price_cents", "min_all_cents", "median_cents", "listing_count"]
+
+# Schéma du CSV : 1 = unités devinées (price_cents parfois en float/USD), 2 = cents entiers canoniques
+SCHEMA_VERSION = 2
+SCHEMA_SUFFIX = ".meta.json"
+
+
+def schema_path(history_csv_path: str) -> str:
+    """Sidecar de version : price_history.csv -> price_history.meta.json."""
+    return os.path.splitext(history_csv_path)[0] + SCHEMA_SUFFIX
+
+
+def schema_meta() -> dict:
+    return {"schema_version": SCHEMA_VERSION, "price_unit": "cents", "price_usd": "price_cents / 100"}
+
+
+def parse_schema_version(text: str) -> int:
+    """Version lue dans le contenu du sidecar (1 si absent ou illisible)."""
+    try:
+        return int(json.loads(text or "{}").get("schema_version", 1))
+    except Exception:
+        return 1
+
+
+def read_schema_version(history_csv_path: str) -> int:
+    path = schema_path(history_csv_path)
+    if not os.path.isfile(path):
+        return 1
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_schema_version(f.read())
+
+
+def write_schema(history_csv_path: str):
+    write_text_atomic(schema_path(history_csv_path), json.dumps(schema_meta(), indent=2) + "\n")
+
+
+UNIT_OUTLIER_RATIO = 30.0   # valeur ~100x sous la médiane de l'item = USD écrit dans price_cents
+
+
+def canonical_cents(df: pd.DataFrame) -> pd.Series:
+    """
+    Prix en cents entiers (Int64), ligne par ligne, depuis l'historique aux unités devinées :
+    - price_cents décimal (ex: 10.12) = USD écrit dans la colonne cents -> x100,
+      ainsi que toutes les lignes du même run (même ts_utc : un run écrit dans une seule unité)
+    - price_cents entier mais ~100x sous la médiane de l'item (ex: 23.0 pour ~2300) -> x100
+    - sinon price_cents est bien en cents (3630.0 -> 3630) ; à défaut, price_usd x100.
+    """
+    usd = pd.to_numeric(df["price_usd"], errors="coerce") if "price_usd" in df.columns else pd.Series(np.nan, index=df.index)
+    if "price_cents" not in df.columns:
+        return (usd * 100).round().astype("Int64")
+    c = pd.to_numeric(df["price_cents"], errors="coerce")
+    frac = (c - np.floor(c)).abs() > 1e-9
+    if "ts_utc" in df.columns:
+        frac = frac.groupby(df["ts_utc"]).transform("any") & c.notna()
+    cents = c.where(~frac, c * 100).round()
+    if "market_hash_name" in df.columns and cents.notna().any():
+        med = cents.groupby(df["market_hash_name"]).transform("median")
+        low = ~frac & (cents > 0) & (med / cents > UNIT_OUTLIER_RATIO)
+        cents = cents.where(~low, cents * 100)
+    return cents.fillna((usd * 100).round()).astype("Int64")
+
+
+def frame_cents(df: pd.DataFrame, schema_version: int = SCHEMA_VERSION) -> pd.Series:
+    """
+    Prix en cents entiers (Int64) selon la version du fichier source : en schéma >= 2, price_cents
+    tel quel (price_usd x100 seulement là où il manque) ; avant, heuristique canonical_cents.
+    """
+    if schema_version < 2:
+        return canonical_cents(df)
+    usd = pd.to_numeric(df["price_usd"], errors="coerce") if "price_usd" in df.columns else pd.Series(np.nan, index=df.index)
+    c = pd.to_numeric(df["price_cents"], errors="coerce") if "price_cents" in df.columns else pd.Series(np.nan, index=df.index)
+    return c.round().fillna((usd * 100).round()).astype("Int64")
+
+
+def normalize_csv(history_csv_path: str) -> int:
+    """
+    Migration unique d'un price_history.csv vers le schéma 2 : price_cents entier,
+    price_usd = price_cents / 100, colonnes annexes entières ; puis écrit le sidecar.
+    Les autres colonnes (ts_utc...) sont conservées telles quelles.
+    """
+    with file_lock(history_csv_path):
+        df = pd.read_csv(history_csv_path, dtype=str, keep_default_na=False, skip_blank_lines=True)
+        cents = canonical_cents(df.replace("", np.nan))
+        df = df[cents.notna()].copy()
+        cents = cents[cents.notna()]
+        df["price_cents"] = cents.astype("int64").astype(str)
+        df["price_usd"] = (cents.astype("int64") / 100.0).map(lambda v: f"{v:.2f}")
+        for c in INT_COLUMNS[1:]:
+            if c in df.columns:
+                v = pd.to_numeric(df[c].replace("", np.nan), errors="coerce").round().astype("Int64")
+                df[c] = v.astype(str).replace("<NA>", "")
+        write_text_atomic(history_csv_path, df.to_csv(index=False))
+        write_schema(history_csv_path)
+    return len(df)
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def dataset_dir(history_csv_path: str) -> str:
+    """Dossier Parquet associé à un price_history.csv."""
+    return os.path.join(os.path.dirname(history_csv_path), DATASET_DIRNAME)
+
+
+def enabled_for(history_csv_path: str) -> bool:
+    if not available() or HISTORY_PARQUET in ("0", "false", "no", "off"):
+        return False
+    if HISTORY_PARQUET in ("1", "true", "yes", "on"):
+        return True
+    return os.path.isdir(dataset_dir(history_csv_path))
+
+
+def _schema():
+    return pa.schema([
+        ("ts", pa.int64()),
+        ("market_hash_name", pa.dictionary(pa.int32(), pa.string())),
+        ("price_cents", pa.int64()),
+        ("min_all_cents", pa.int64()),
+        ("median_cents", pa.int64()),
+        ("listing_count", pa.int64()),
+    ])
+
+
+def normalize_frame(df: pd.DataFrame, schema_version: int = SCHEMA_VERSION) -> pd.DataFrame:
+    """
+    Lignes price_history (CSV ou dicts) -> frame canonique : ts epoch, cents entiers.
+    Prix via frame_cents : price_cents tel quel pour un fichier en schéma >= 2 (défaut : lignes
+    fraîches ou fichier migré) ; l'heuristique d'unités de canonical_cents ne sert qu'aux
+    fichiers schéma 1 (read_schema_version du sidecar).
+    """
+    out = pd.DataFrame()
+    if df.empty:
+        return pd.DataFrame(columns=["ts", "market_hash_name"] + INT_COLUMNS)
+    ts = pd.to_datetime(df["ts_utc"], errors="coerce", utc=True)
+    out["ts"] = (ts - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    out["market_hash_name"] = df["market_hash_name"].astype(str).str.strip()
+
+    out["price_cents"] = frame_cents(df, schema_version).astype("float64")
+    for c in INT_COLUMNS[1:]:
+        out[c] = pd.to_numeric(df[c], errors="coerce").round() if c in df.columns else np.nan
+
+    out = out.dropna(subset=["ts", "price_cents"])
+    out = out[out["market_hash_name"].str.len() > 0]
+    out["ts"] = out["ts"].astype("int64")
+    for c in INT_COLUMNS:
+        out[c] = out[c].astype("Int64")
+    return out.reset_index(drop=True)
+
+
+def _month_of(ts: pd.Series) -> pd.Series:
+    return pd.to_datetime(ts, unit="s", utc=True).dt.strftime("%Y-%m")
+
+
+def _write_partition(path: str, frame: pd.DataFrame):
+    frame = frame.sort_values(["ts", "market_hash_name"]).reset_index(drop=True)
+    table = pa.Table.from_pandas(frame, schema=_schema(), preserve_index=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd", use_dictionary=True)
+    os.replace(tmp, path)
+
+
+def append_rows(ds_dir: str, df: pd.DataFrame) -> int:
+    """Ajoute des lignes (format price_history) au dataset ; réécrit seulement les mois touchés."""
+    if not available():
+        return 0
+    new = normalize_frame(df)
+    if new.empty:
+        return 0
+    for month, part in new.groupby(_month_of(new["ts"])):
+        path = os.path.join(ds_dir, f"{PARTITION_PREFIX}{month}", PARTITION_FILE)
+        if os.path.isfile(path):
+            old = pq.read_table(path).to_pandas()
+            old["market_hash_name"] = old["market_hash_name"].astype(str)
+            part = pd.concat([old, part], ignore_index=True)
+        part = part.drop_duplicates(subset=["ts", "market_hash_name"], keep="last")
+        _write_partition(path, part)
+    return len(new)
+
+
+def list_months(ds_dir: str) -> List[str]:
+    if not os.path.isdir(ds_dir):
+        return []
+    return sorted(d[len(PARTITION_PREFIX):] for d in os.listdir(ds_dir) if d.startswith(PARTITION_PREFIX))
+
+
+def prune_months(months: List[str], start=None, end=None) -> List[str]:
+    """Garde les partitions qui recoupent [start, end] (bornes incluses, None = ouvert)."""
+    lo = pd.Timestamp(start).strftime("%Y-%m") if start is not None else None
+    hi = pd.Timestamp(end).strftime("%Y-%m") if end is not None else None
+    return [m for m in months if (lo is None or m >= lo) and (hi is None or m <= hi)]
+
+
+def read_partition(source, columns: Optional[List[str]] = None, names: Optional[List[str]] = None) -> pd.DataFrame:
+    """Lit un fichier de partition (chemin ou bytes) avec élagage colonnes / items."""
+    if isinstance(source, (bytes, bytearray)):
+        source = pa.BufferReader(source)
+    cols = None
+    if columns is not None:
+        cols = list(dict.fromkeys(["ts", "market_hash_name"] + [c for c in columns if c in INT_COLUMNS]))
+    filters = [("market_hash_name", "in", list(names))] if names else None
+    return pq.read_table(source, columns=cols, filters=filters).to_pandas()
+
+
+def to_history_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Frame canonique -> colonnes attendues par l'app (ts_utc, market_hash_name, price_usd...)."""
+    if frame.empty:
+        return pd.DataFrame(columns=["ts_utc", "market_hash_name", "price_cents", "price_usd"])
+    out = frame.copy()
+    out.insert(0, "ts_utc", pd.to_datetime(out.pop("ts"), unit="s", utc=True))
+    out["market_hash_name"] = out["market_hash_name"].astype(str)
+    if "price_cents" in out.columns:
+        out["price_usd"] = out["price_cents"].astype("float64") / 100.0
+    return out
+
+
+def read_history(ds_dir: str, columns: Optional[List[str]] = None, start=None, end=None,
+                 names: Optional[List[str]] = None) -> pd.DataFrame:
+    """Lecture locale du dataset avec élagage des partitions, des colonnes et des items."""
+    if not available():
+        return pd.DataFrame()
+    frames = []
+    for month in prune_months(list_months(ds_dir), start, end):
+        path = os.path.join(ds_dir, f"{PARTITION_PREFIX}{month}", PARTITION_FILE)
+        if os.path.isfile(path):
+            frames.append(read_partition(path, columns, names))
+    if not frames:
+        return pd.DataFrame()
+    out = to_history_frame(pd.concat(frames, ignore_index=True))
+    if start is not None:
+        out = out[out["ts_utc"] >= pd.Timestamp(start, tz="UTC")]
+    if end is not None:
+        out = out[out["ts_utc"] <= pd.Timestamp(end, tz="UTC")]
+    return out.reset_index(drop=True)
+
+
+def migrate_csv(history_csv_path: str) -> int:
+    """Convertit un price_history.csv existant en dataset Parquet (les mois présents sont réécrits)."""
+    df = pd.read_csv(history_csv_path, skip_blank_lines=True)
+    new = normalize_frame(df, read_schema_version(history_csv_path)).drop_duplicates(subset=["ts", "market_hash_name"], keep="last")
+    ds_dir = dataset_dir(history_csv_path)
+    for month, part in new.groupby(_month_of(new["ts"])):
+        _write_partition(os.path.join(ds_dir, f"{PARTITION_PREFIX}{month}", PARTITION_FILE), part)
+    return len(new)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("migrate", "normalize"):
+        print("Usage: python history_store.py normalize|migrate <data/<profil>/price_history.csv> [...]")
+        sys.exit(1)
+    cmd, paths = sys.argv[1], sys.argv[2:]
+    if cmd == "normalize":
+        for path in paths:
+            n = normalize_csv(path)
+            print(f"[NORMALIZE] {path}: {n} lignes en cents entiers (schéma v{SCHEMA_VERSION}) -> {schema_path(path)}")
+        return
+    if not available():
+        print("[FATAL] pyarrow manquant (pip install pyarrow).")
+        sys.exit(1)
+    for path in paths:
+        n = migrate_csv(path)
+        ds_dir = dataset_dir(path)
+        size_csv = os.path.getsize(path)
+        size_pq = sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(ds_dir) for f in fs)
+        print(f"[MIGRATE] {path}: {n} lignes -> {ds_dir} ({len(list_months(ds_dir))} mois, "
+              f"{size_csv / 1024:.0f} Ko CSV -> {size_pq / 1024:.0f} Ko Parquet)")
+
+
+if __name__ == "__main__":
+    main()
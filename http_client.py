@@ -0,0 +1,124 @@
+"""
+HTTP Client
+
+Couche HTTP partagée par fetch_prices.py et l'app Streamlit :
+session keep-alive (pool de connexions) + retries avec backoff
+exponentiel jitteré, respect du header Retry-After et plafond de retries.
+
+Méthodes non idempotentes (POST, PATCH, PUT... ex: commits / refs Git Data) : rejouées seulement
+sur 429 ou sur une erreur de connexion levée avant l'envoi, jamais sur 5xx ou timeout de lecture
+(la requête a pu être appliquée) ; `idempotent=True` lève cette restriction.
+"""
+
+import time
+import random
+import threading
+import email.utils
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from typing import Callable, Optional
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+MAX_RETRIES = 4          # tentatives supplémentaires max par requête
+BACKOFF_BASE = 0.5       # secondes, doublé à chaque tentative
+BACKOFF_MAX = 30.0       # plafond d'attente entre deux tentatives
+POOL_SIZE = 16           # connexions keep-alive gardées par hôte
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Session unique du process (créée à la demande, thread-safe)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    """Délai demandé par le serveur (secondes ou date HTTP), None si absent/illisible."""
+    raw = resp.headers.get("Retry-After")
+    if not raw:
+        return None
+    raw = raw.strip()
+    if raw.isdigit():
+        return float(raw)
+    try:
+        when = email.utils.parsedate_to_datetime(raw)
+        return max(0.0, when.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _not_sent(e: Exception) -> bool:
+    """Erreur levée avant l'envoi (connexion jamais établie) : sans effet côté serveur."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(e, requests.ConnectionError) and isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def _backoff(attempt: int) -> float:
+    """Backoff exponentiel 'full jitter'."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def request(
+    method: str,
+    url: str,
+    max_retries: int = MAX_RETRIES,
+    before_attempt: Optional[Callable[[], None]] = None,
+    idempotent: Optional[bool] = None,
+    **kwargs,
+) -> requests.Response:
+    """
+    Requête HTTP via la session partagée, avec retries sur 429/5xx et erreurs réseau.
+
+    Args:
+        method: verbe HTTP
+        url: URL cible
+        max_retries: nb max de nouvelles tentatives
+        before_attempt: appelé avant chaque tentative (ex: limiteur de débit)
+        idempotent: rejouable sans risque (défaut : GET / HEAD / OPTIONS) ; sinon retries
+            seulement sur 429 et erreurs de connexion avant envoi
+        **kwargs: transmis à requests (params, headers, timeout...)
+
+    Returns:
+        La dernière réponse obtenue (l'appelant gère raise_for_status)
+    """
+    session = get_session()
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    statuses = RETRY_STATUSES if idempotent else {429}
+    for attempt in range(max_retries + 1):
+        if before_attempt is not None:
+            before_attempt()
+        try:
+            r = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= max_retries or not (idempotent or _not_sent(e)):
+                raise
+            wait = _backoff(attempt)
+            print(f"[RETRY] {type(e).__name__} sur {url}; nouvel essai dans {wait:.1f}s…")
+            time.sleep(wait)
+            continue
+
+        if r.status_code not in statuses or attempt >= max_retries:
+            return r
+        wait = _retry_after(r)
+        wait = min(BACKOFF_MAX, wait) if wait is not None else _backoff(attempt)
+        print(f"[RATE] {r.status_code} sur {url}; nouvel essai {attempt + 1}/{max_retries} dans {wait:.1f}s…")
+        time.sleep(wait)
+    return r
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Ledger
+
+Moteur unique du journal des trades (trades.csv) : un seul rejeu par version du journal,
+qui alimente les positions ouvertes (holdings.csv), l'historique des transactions avec le P&L
+de chaque vente, et les totaux des indicateurs financiers. Méthode de coût au choix :
+
+- fifo : une vente consomme les lots les plus anciens (coût par interpolation sur la courbe
+  cumulée quantité -> coût des achats de l'item, tout en vectoriel)
+- lifo : une vente consomme les lots les plus récents (une pile par item, un seul parcours)
+- average : coût moyen pondéré, qui ne change qu'aux achats (un seul parcours des BUY)
+
+Règles communes : trades rejoués par item dans l'ordre (date, ordre du fichier) ; une vente ne rend
+jamais la position négative (la part vendue au-delà de la position n'a pas de coût d'achat).
+
+- empreinte par ligne du journal : rien n'est recalculé tant qu'il ne change pas ; si des lignes
+  ont seulement été ajoutées à la fin, seuls les items concernés sont rejoués
+- `version` change à chaque recalcul effectif : l'app ne réécrit holdings.csv que dans ce cas
+
+Benchmark sur un journal synthétique :
+    python ledger.py bench --trades 50000
+"""
+
+import sys
+import time
+import hashlib
+import threading
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+METHODS = ("fifo", "lifo", "average")
+TRADE_COLUMNS = ["date", "type", "market_hash_name", "qty", "price_usd", "trade_id"]
+HISTORY_COLUMNS = ["type", "market_hash_name", "qty", "buy_price_usd", "sell_price_usd", "pnl_value_usd", "pnl_pct", "date", "trade_id"]
+HOLDINGS_COLUMNS = ["market_hash_name", "qty", "buy_price_usd", "buy_date", "notes"]
+
+
+def row_hashes(trades: pd.DataFrame) -> np.ndarray:
+    """Empreinte uint64 de chaque ligne (colonnes utiles au calcul seulement)."""
+    cols = [c for c in TRADE_COLUMNS if c in trades.columns]
+    if trades.empty:
+        return np.empty(0, dtype="uint64")
+    return pd.util.hash_pandas_object(trades[cols], index=False).to_numpy()
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """Empreinte d'un frame entier (colonnes + valeurs affichées), stable entre CSV et SQLite."""
+    h = hashlib.sha1(",".join(map(str, df.columns)).encode())
+    if not df.empty:
+        h.update(pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def normalize_trades(trades: pd.DataFrame, offset: int = 0) -> pd.DataFrame:
+    """Colonnes typées + `ts` (date parsée) + `seq` (ordre d'origine, départage les trades du même jour)."""
+    t = pd.DataFrame({
+        "date": trades["date"].astype(str) if "date" in trades.columns else "",
+        "type": trades["type"].astype(str).str.upper() if "type" in trades.columns else "",
+        "market_hash_name": trades["market_hash_name"].astype(str) if "market_hash_name" in trades.columns else "",
+        "qty": pd.to_numeric(trades["qty"], errors="coerce").fillna(0.0).astype("float64") if "qty" in trades.columns else 0.0,
+        "price_usd": pd.to_numeric(trades["price_usd"], errors="coerce").astype("float64") if "price_usd" in trades.columns else np.nan,
+        "trade_id": trades["trade_id"].to_numpy() if "trade_id" in trades.columns else None,
+    })
+    t["ts"] = pd.to_datetime(t["date"], errors="coerce")
+    t["seq"] = np.arange(offset, offset + len(t), dtype="int64")
+    return t.reset_index(drop=True)
+
+
+def _empty_history() -> pd.DataFrame:
+    return pd.DataFrame(columns=HISTORY_COLUMNS + ["seq"])
+
+
+def _average_scan(grp, is_buy, q, price, pos_before):
+    """Coût moyen après chaque ligne (reporté sur les SELL) : avg = (avg * pos_avant + prix * qty) / (pos_avant + qty)."""
+    avg_after = np.full(len(grp), np.nan)
+    cur, avg = -1, 0.0
+    for i in np.flatnonzero(is_buy).tolist():
+        g, pp, qq = grp[i], pos_before[i], q[i]
+        if g != cur:
+            cur, avg = g, 0.0
+        tot = pp + qq
+        avg = (avg * pp + price[i] * qq) / tot if tot > 0 else 0.0
+        avg_after[i] = avg
+    return pd.Series(avg_after).groupby(grp).ffill().fillna(0.0).to_numpy()
+
+
+def _lifo_scan(grp, is_buy, q, cost_price, taken):
+    """Pile de lots par item : coût des unités sorties par chaque SELL, reste de chaque BUY."""
+    n = len(grp)
+    sold_cost = np.zeros(n)
+    rem = np.where(is_buy, q, 0.0)
+    stack, cur = [], -1
+    for i in range(n):
+        if grp[i] != cur:
+            stack, cur = [], grp[i]
+        if is_buy[i]:
+            if rem[i] > 0:
+                stack.append(i)
+            continue
+        need, cost = taken[i], 0.0
+        while need > 1e-12 and stack:
+            j = stack[-1]
+            use = min(rem[j], need)
+            cost += use * cost_price[j]
+            rem[j] -= use
+            need -= use
+            if rem[j] <= 1e-12:
+                stack.pop()
+        sold_cost[i] = cost
+    return sold_cost, rem
+
+
+def replay(t: pd.DataFrame, method: str = "fifo"):
+    """
+    Rejoue des trades normalisés (tous items à la fois) -> (lots ouverts, historique par trade).
+    Lots au format holdings.csv ; historique au format HISTORY_COLUMNS (+ seq), le plus récent en premier.
+    """
+    if method not in METHODS:
+        raise ValueError(f"méthode de coût inconnue : {method} ({', '.join(METHODS)})")
+    t = t[t["type"].isin(["BUY", "SELL"])]
+    if t.empty:
+        return pd.DataFrame(columns=HOLDINGS_COLUMNS), _empty_history()
+    t = t.sort_values(["market_hash_name", "ts", "seq"], kind="mergesort").reset_index(drop=True)
+    n = len(t)
+    item = t["market_hash_name"].to_numpy()
+    first = np.ones(n, dtype=bool)
+    first[1:] = item[1:] != item[:-1]
+    grp = np.cumsum(first) - 1
+    last = np.r_[first[1:], True]
+    is_buy = (t["type"] == "BUY").to_numpy()
+    q = np.maximum(t["qty"].to_numpy(), 0.0)
+    price = t["price_usd"].to_numpy()
+    cost_price = np.nan_to_num(price)
+
+    # position : somme cumulée signée avec plancher à 0, pos_k = S_k - min(0, min_{j<=k} S_j)
+    raw = pd.Series(np.where(is_buy, q, -q)).groupby(grp).cumsum()
+    pos_after = (raw - np.minimum(0.0, raw.groupby(grp).cummin())).to_numpy()
+    pos_before = np.where(first, 0.0, np.r_[0.0, pos_after[:-1]])
+    taken = np.where(is_buy, 0.0, pos_before - pos_after)  # unités réellement sorties par chaque SELL
+
+    if method == "average":
+        avg = _average_scan(grp, is_buy, q, price, pos_before)
+        unit = avg
+        # une ligne par item encore détenu, au coût moyen, datée du début de la détention en cours
+        start = pd.Series(np.where(is_buy & (pos_before <= 0) & (q > 0), np.arange(n), -1)).groupby(grp).cummax().to_numpy()
+        keep = last & (pos_after > 0)
+        lots = pd.DataFrame({
+            "market_hash_name": item[keep],
+            "qty": pos_after[keep],
+            "buy_price_usd": avg[keep],
+            "buy_date": t["date"].to_numpy()[np.maximum(start[keep], 0)],
+            "notes": "",
+        })
+    else:
+        if method == "fifo":
+            # unités sorties cumulées par item = abscisse sur la courbe quantité -> coût des achats
+            buy_q = np.where(is_buy, q, 0.0)
+            bought = np.cumsum(buy_q)                       # global, items à la suite
+            base = (bought - buy_q)[first][grp]             # unités achetées avant l'item
+            used = pd.Series(taken).groupby(grp).cumsum().to_numpy()
+            xp = np.r_[0.0, bought[is_buy]]
+            fp = np.r_[0.0, np.cumsum(buy_q * cost_price)[is_buy]]
+            sold_cost = np.where(is_buy, 0.0, np.interp(base + used, xp, fp) - np.interp(base + used - taken, xp, fp))
+            used_total = pd.Series(used).groupby(grp).transform("last").to_numpy()
+            rem = np.where(is_buy, np.minimum(buy_q, np.maximum(0.0, (bought - base) - used_total)), 0.0)
+        else:
+            sold_cost, rem = _lifo_scan(grp, is_buy, q, cost_price, taken)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            unit = np.where(taken > 0, sold_cost / taken, 0.0)
+        keep = is_buy & (rem > 1e-12)
+        lots = pd.DataFrame({
+            "market_hash_name": item[keep],
+            "qty": rem[keep],
+            "buy_price_usd": price[keep],
+            "buy_date": t["date"].to_numpy()[keep],
+            "notes": "",
+        })
+
+    sell = ~is_buy
+    pnl = np.where(sell, (price - unit) * q, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(sell & (unit > 0), pnl / (unit * q) * 100.0, np.nan)
+    hist = pd.DataFrame({
+        "type": t["type"],
+        "market_hash_name": item,
+        "qty": q,
+        "buy_price_usd": np.where(is_buy, price, unit),
+        "sell_price_usd": np.where(sell, price, np.nan),
+        "pnl_value_usd": pnl,
+        "pnl_pct": pct,
+        "date": t["ts"],
+        "trade_id": t["trade_id"],
+        "seq": t["seq"],
+    })
+    return lots, _order_history(hist)
+
+
+def _order_history(hist: pd.DataFrame) -> pd.DataFrame:
+    """Plus récent d'abord ; ordre total (item, seq) pour qu'un rejeu partiel donne le même résultat."""
+    return hist.sort_values(["date", "market_hash_name", "seq"], ascending=[False, True, True],
+                            kind="mergesort").reset_index(drop=True)
+
+
+def summarize(lots: pd.DataFrame, hist: pd.DataFrame) -> dict:
+    """Totaux du journal pour les indicateurs financiers."""
+    buy = hist["type"] == "BUY"
+    amount = hist["qty"] * np.where(buy, hist["buy_price_usd"], hist["sell_price_usd"])
+    return {
+        "realized_pnl": float(np.nansum(hist["pnl_value_usd"].to_numpy(dtype="float64"))),
+        "buys_usd": float(amount[buy].sum()),
+        "sells_usd": float(amount[~buy].sum()),
+        "open_qty": float(lots["qty"].sum()) if not lots.empty else 0.0,
+        "open_cost_usd": float((lots["qty"] * lots["buy_price_usd"]).sum()) if not lots.empty else 0.0,
+    }
+
+
+class LedgerEngine:
+    """
+    Journal d'un profil rejoué selon `method`, tenu à jour entre les reruns.
+    sync(trades) -> True si le journal a été rejoué.
+    Partagé entre sessions : sync et lectures passent par `lock` (réentrant) ; le tenir autour
+    de sync + lecture pour lire le rejeu du journal que l'on vient de synchroniser.
+    """
+
+    def __init__(self, method: str = "fifo"):
+        if method not in METHODS:
+            raise ValueError(f"méthode de coût inconnue : {method} ({', '.join(METHODS)})")
+        self.method = method
+        self.hashes = np.empty(0, dtype="uint64")
+        self.trades = normalize_trades(pd.DataFrame(columns=TRADE_COLUMNS))
+        self.lots = pd.DataFrame(columns=HOLDINGS_COLUMNS)
+        self.history = _empty_history()
+        self.version = 0
+        self.persisted_version = None  # version écrite dans holdings.csv (tenu par l'app)
+        self._memo = {}  # nom -> (version, résultat) des vues dérivées du rejeu
+        self.stats = {"noop": 0, "incremental": 0, "full": 0}
+        self.lock = threading.RLock()
+
+    def sync(self, trades: pd.DataFrame) -> bool:
+        hashes = row_hashes(trades)
+        with self.lock:
+            n_old = len(self.hashes)
+            if len(hashes) == n_old and np.array_equal(hashes, self.hashes):
+                self.stats["noop"] += 1
+                return False
+            if self.version and len(hashes) > n_old and np.array_equal(hashes[:n_old], self.hashes):
+                self._apply_appended(trades.iloc[n_old:], n_old)
+                self.stats["incremental"] += 1
+            else:
+                self.trades = normalize_trades(trades)
+                self.lots, self.history = replay(self.trades, self.method)
+                self.stats["full"] += 1
+            self.hashes = hashes
+            self.version += 1
+            return True
+
+    def _apply_appended(self, new_rows: pd.DataFrame, offset: int):
+        """Nouveaux trades en fin de journal : seuls les items touchés sont rejoués."""
+        new = normalize_trades(new_rows, offset)
+        self.trades = pd.concat([self.trades, new], ignore_index=True)
+        dirty = set(new["market_hash_name"])
+        lots, hist = replay(self.trades[self.trades["market_hash_name"].isin(dirty)], self.method)
+        rest = self.lots[~self.lots["market_hash_name"].isin(dirty)]
+        merged = pd.concat([rest, lots], ignore_index=True) if not rest.empty else lots
+        # même ordre qu'un rejeu complet : item, puis ordre d'achat (tri stable)
+        self.lots = merged.sort_values("market_hash_name", kind="mergesort").reset_index(drop=True)
+        rest = self.history[~self.history["market_hash_name"].isin(dirty)]
+        self.history = _order_history(pd.concat([rest, hist], ignore_index=True) if not rest.empty else hist)
+
+    def _cached(self, name: str, fn):
+        """Résultat de fn(), recalculé une fois par version du journal."""
+        with self.lock:
+            hit = self._memo.get(name)
+            if hit is None or hit[0] != self.version:
+                hit = (self.version, fn())
+                self._memo[name] = hit
+            return hit[1]
+
+    def open_lots(self) -> pd.DataFrame:
+        with self.lock:
+            return self.lots.copy()
+
+    def trade_history(self) -> pd.DataFrame:
+        """Historique par trade (onglet Transactions) : prix d'achat retenu et P&L de chaque vente."""
+        return self._cached("history", lambda: self.history[HISTORY_COLUMNS].reset_index(drop=True))
+
+    def totals(self) -> dict:
+        return self._cached("totals", lambda: summarize(self.lots, self.history))
+
+    def realized_pnl(self) -> float:
+        return self.totals()["realized_pnl"]
+
+
+# ---------- benchmark ----------
+def synthetic_trades(n: int, items: int = 300, seed: int = 7) -> pd.DataFrame:
+    """Journal synthétique : ~70 % de BUY, dates croissantes sur ~5 ans, jamais de vente à découvert."""
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, 5 * 365, n))
+    names = rng.integers(0, items, n).tolist()
+    qty = rng.integers(1, 4, n).tolist()
+    want_sell = (rng.random(n) >= 0.7).tolist()
+    pos = [0] * items
+    types = []
+    for k, q, s in zip(names, qty, want_sell):
+        sell = s and pos[k] >= q
+        pos[k] += -q if sell else q
+        types.append("SELL" if sell else "BUY")
+    return pd.DataFrame({
+        "date": (pd.Timestamp("2021-01-01") + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%d"),
+        "type": types,
+        "market_hash_name": [f"Item {i:04d}" for i in names],
+        "qty": qty,
+        "price_usd": np.round(rng.uniform(0.5, 500.0, n), 2),
+        "note": "",
+        "trade_id": [f"trd_{i:08x}" for i in range(n)],
+    })
+
+
+def _legacy_rebuild_holdings(trades: pd.DataFrame) -> pd.DataFrame:
+    """Ancien rebuild_holdings (groupby + iterrows + boucles de lots), pour comparaison."""
+    holdings = []
+    for name, g in trades.groupby("market_hash_name"):
+        buys = g[g["type"] == "BUY"].copy().sort_values("date")
+        sells = g[g["type"] == "SELL"].copy().sort_values("date")
+        buy_lots = []
+        for _, row in buys.iterrows():
+            qty = float(row["qty"])
+            if qty <= 0:
+                continue
+            buy_lots.append({"qty": qty, "price_usd": float(row["price_usd"]), "date": row["date"]})
+        for _, row in sells.iterrows():
+            sell_qty = float(row["qty"])
+            if sell_qty <= 0:
+                continue
+            for lot in buy_lots:
+                if sell_qty <= 0:
+                    break
+                if lot["qty"] <= 0:
+                    continue
+                consumed = min(lot["qty"], sell_qty)
+                lot["qty"] -= consumed
+                sell_qty -= consumed
+        for lot in buy_lots:
+            if lot["qty"] > 0:
+                holdings.append([name, lot["qty"], lot["price_usd"], lot["date"], ""])
+    return pd.DataFrame(holdings, columns=HOLDINGS_COLUMNS)
+
+
+def _legacy_trade_history(trades_df: pd.DataFrame) -> pd.DataFrame:
+    """Ancien compute_trade_history_table (groupby + iterrows + dicts), pour comparaison."""
+    df = trades_df.copy()
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.sort_values(["market_hash_name", "date", "trade_id"]).reset_index(drop=True)
+    out_rows = []
+    for name, g in df.groupby("market_hash_name", sort=False):
+        pos = 0.0
+        avg_cost = 0.0
+        for _, r in g.iterrows():
+            ttype = str(r["type"]).upper()
+            qty = float(r["qty"])
+            price = float(r["price_usd"])
+            if ttype == "BUY":
+                pos_new = pos + qty
+                avg_cost = (avg_cost * pos + price * qty) / pos_new if pos_new > 0 else 0.0
+                pos = pos_new
+                out_rows.append({"trade_id": r.get("trade_id"), "buy_price_usd": price, "pnl_value_usd": None})
+            elif ttype == "SELL":
+                out_rows.append({"trade_id": r.get("trade_id"), "buy_price_usd": avg_cost,
+                                 "pnl_value_usd": (price - avg_cost) * qty})
+                pos = max(0.0, pos - qty)
+    return pd.DataFrame(out_rows)
+
+
+def _frames_close(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    try:
+        pd.testing.assert_frame_equal(a, b, check_exact=False)
+        return True
+    except AssertionError:
+        return False
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def bench(n: int, items: int, legacy: bool = True) -> dict:
+    trades = synthetic_trades(n, items)
+    res = {}
+    if legacy:
+        old, res["legacy_holdings_ms"] = _timed(_legacy_rebuild_holdings, trades)
+        old_hist, res["legacy_history_ms"] = _timed(_legacy_trade_history, trades)
+    eng = LedgerEngine("fifo")
+    _, res["engine_full_ms"] = _timed(eng.sync, trades)
+    _, res["engine_noop_ms"] = _timed(eng.sync, trades)
+    more = pd.concat([trades, synthetic_trades(1, items, seed=99).assign(date="2026-12-31")], ignore_index=True)
+    _, res["engine_append_ms"] = _timed(eng.sync, more)
+    _, res["views_ms"] = _timed(lambda: (eng.open_lots(), eng.trade_history(), eng.totals()))
+    _, res["views_cached_ms"] = _timed(lambda: (eng.sync(more), eng.open_lots(), eng.trade_history(), eng.totals()))
+    t = normalize_trades(trades)
+    for m in METHODS:
+        _, res[f"replay_{m}_ms"] = _timed(replay, t, m)
+    full = LedgerEngine("fifo")
+    full.sync(more)
+    res["same_incremental"] = _frames_close(full.lots, eng.lots) and _frames_close(full.history, eng.history)
+    if legacy:
+        a = old.sort_values(["market_hash_name", "buy_date", "qty"]).reset_index(drop=True)
+        b = replay(t, "fifo")[0].sort_values(["market_hash_name", "buy_date", "qty"]).reset_index(drop=True)
+        res["same_holdings"] = bool(len(a) == len(b) and np.allclose(a["qty"], b["qty"])
+                                    and (a["market_hash_name"].to_numpy() == b["market_hash_name"].to_numpy()).all())
+        new_hist = replay(t, "average")[1].set_index("trade_id").loc[old_hist["trade_id"]]
+        res["same_history"] = bool(np.allclose(new_hist["buy_price_usd"], old_hist["buy_price_usd"])
+                                   and np.allclose(new_hist["pnl_value_usd"].fillna(0), old_hist["pnl_value_usd"].fillna(0)))
+    return res
+
+
+def main(argv: Optional[list] = None):
+    p = argparse.ArgumentParser(description="Moteur du journal des trades (FIFO / LIFO / coût moyen)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="compare les anciens calculs au moteur sur un journal synthétique")
+    b.add_argument("--trades", type=int, default=50000)
+    b.add_argument("--items", type=int, default=300)
+    b.add_argument("--no-legacy", action="store_true", help="ne pas chronométrer l'ancienne implémentation")
+    args = p.parse_args(argv)
+
+    res = bench(args.trades, args.items, legacy=not args.no_legacy)
+    for k, v in res.items():
+        print(f"[BENCH] {k}: {v:.1f}" if isinstance(v, float) else f"[BENCH] {k}: {v}")
+    if "legacy_holdings_ms" in res:
+        legacy_ms = res["legacy_holdings_ms"] + res["legacy_history_ms"]
+        print(f"[BENCH] speedup (anciens holdings + historique) rejeu complet: x{legacy_ms / max(res['engine_full_ms'], 1e-6):.0f}, "
+              f"rerun sans changement: x{legacy_ms / max(res['views_cached_ms'], 1e-6):.0f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,9 +10,9 @@ import requests
 import pandas as pd
 from typing import Optional, List, Tuple
 
-# Configuration
-STEAM_API_BASE = "https://api.steampowered.com"
-STEAM_COMMUNITY_BASE = "https://steamcommunity.com"
+# Configuration (surchargeable pour pointer vers stub_server.py)
+STEAM_API_BASE = os.getenv("STEAM_API_BASE", "https://api.steampowered.com").rstrip("/")
+STEAM_COMMUNITY_BASE = os.getenv("STEAM_COMMUNITY_BASE", "https://steamcommunity.com").rstrip("/")
 
 CS2_APPID = 730
 CS2_CONTEXT_ID = 2
@@ -0,0 +1,434 @@
+"""
+Storage
+
+Couche de persistance des données d'un profil (data/<profil>/), derrière une interface commune :
+
+- CsvStorage : les CSV historiques (trades.csv, finances.csv...) ; pour les tables à clé
+  (trades, finances), un ajout / une suppression s'écrit dans un journal append-only
+  <table>.journal.jsonl (événements add + tombstones del), replié sur le CSV à la lecture et
+  compacté dans le CSV au-delà de JOURNAL_COMPACT_EVERY événements
+- SqliteStorage : base embarquée data/<profil>/portfolio.sqlite, tables indexées, écritures
+  transactionnelles ligne à ligne, ticks de prix indexés sur (market_hash_name, ts)
+
+Dans les deux cas les CSV (+ journaux) restent le format partagé avec GitHub : write() renvoie
+les fichiers miroirs modifiés, read_mirror(path) leur contenu à pousser.
+Au premier démarrage, la base SQLite est amorcée depuis les CSV existants (journaux repliés).
+
+Choix du backend : STORAGE_BACKEND=csv (défaut) | sqlite
+
+Compaction manuelle des journaux :
+    python storage.py compact data/            # tous les profils
+    python storage.py compact data/pierre
+"""
+
+import os
+import sys
+import abc
+import json
+import sqlite3
+import argparse
+import threading
+import contextlib
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+from atomic_io import file_lock, write_text_atomic
+import history_store
+
+# table -> fichier miroir, colonnes (type SQLite), clé de ligne éventuelle
+TABLES = {
+    "trades": {
+        "file": "trades.csv",
+        "columns": [("date", "TEXT"), ("type", "TEXT"), ("market_hash_name", "TEXT"), ("qty", "NUMERIC"),
+                    ("price_usd", "REAL"), ("note", "TEXT"), ("trade_id", "TEXT")],
+        "key": "trade_id",
+        "indexes": [("market_hash_name", "date"), ("date",)],
+    },
+    "holdings": {
+        "file": "holdings.csv",
+        "columns": [("market_hash_name", "TEXT"), ("qty", "NUMERIC"), ("buy_price_usd", "REAL"),
+                    ("buy_date", "TEXT"), ("notes", "TEXT")],
+        "key": None,
+        "indexes": [("market_hash_name",)],
+    },
+    "finances": {
+        "file": "finances.csv",
+        "columns": [("date", "TEXT"), ("type", "TEXT"), ("amount_usd", "REAL"), ("note", "TEXT"), ("finance_id", "TEXT")],
+        "key": "finance_id",
+        "indexes": [("date",)],
+    },
+    "csfloat_snapshot": {
+        "file": "csfloat_snapshot.csv",
+        "columns": [("snapshot_date", "TEXT"), ("balance_usd", "REAL")],
+        "key": None,
+        "indexes": [("snapshot_date",)],
+    },
+    "finance_baseline": {
+        "file": "finance_baseline.csv",
+        "columns": [("baseline_date", "TEXT"), ("baseline_net_deposited_usd", "REAL"), ("note", "TEXT")],
+        "key": None,
+        "indexes": [("baseline_date",)],
+    },
+}
+
+DB_NAME = "portfolio.sqlite"
+BACKENDS = ("csv", "sqlite")
+JOURNAL_SUFFIX = ".journal.jsonl"
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "100"))  # 0 = jamais automatiquement
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def columns_of(table: str) -> List[str]:
+    return [c for c, _t in TABLES[table]["columns"]]
+
+
+def empty_frame(table: str) -> pd.DataFrame:
+    return pd.DataFrame(columns=columns_of(table))
+
+
+def journaled(table: str) -> bool:
+    return bool(TABLES[table]["key"])
+
+
+def _records(df: pd.DataFrame) -> List[dict]:
+    """Lignes -> dicts JSON natifs (NaN -> null, numpy -> int/float)."""
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def fold_journal(snapshot: pd.DataFrame, events: List[dict], key: str) -> pd.DataFrame:
+    """Rejoue les événements (add / del par clé) sur le snapshot ; idempotent si rejoué deux fois."""
+    if not events:
+        return snapshot
+    adds: Dict[str, dict] = {}
+    dels = set()
+    for ev in events:
+        if ev.get("op") == "add":
+            row = ev.get("row") or {}
+            k = str(row.get(key))
+            adds.pop(k, None)  # un ré-ajout passe en fin de table
+            adds[k] = row
+            dels.discard(k)
+        elif ev.get("op") == "del":
+            k = str(ev.get("key"))
+            adds.pop(k, None)
+            dels.add(k)
+    keys = snapshot[key].astype(str) if key in snapshot.columns else pd.Series([], dtype=str)
+    kept = snapshot[~keys.isin(dels | set(adds))]
+    if not adds:
+        return kept.reset_index(drop=True)
+    added = pd.DataFrame(list(adds.values()))
+    out = pd.concat([kept, added], ignore_index=True) if not kept.empty else added
+    return out.reindex(columns=list(dict.fromkeys([*snapshot.columns, *added.columns])))
+
+
+class Storage(abc.ABC):
+    """Interface commune ; `write` applique inserts / suppressions / remplacements en un seul lot."""
+
+    backend = "base"
+    supports_ticks = False
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+
+    def csv_path(self, table: str) -> str:
+        return os.path.join(self.data_dir, TABLES[table]["file"])
+
+    def journal_path(self, table: str) -> str:
+        return os.path.splitext(self.csv_path(table))[0] + JOURNAL_SUFFIX
+
+    @abc.abstractmethod
+    def load(self, table: str) -> pd.DataFrame:
+        """Table complète (journal replié pour les tables à clé)."""
+
+    @abc.abstractmethod
+    def write(self, insert: Optional[Dict[str, pd.DataFrame]] = None, delete: Optional[Dict[str, Iterable[str]]] = None,
+              replace: Optional[Dict[str, pd.DataFrame]] = None) -> List[str]:
+        """Applique le lot ; renvoie les fichiers miroirs (GitHub) à synchroniser."""
+
+    def export_csv(self, table: str) -> str:
+        return self.load(table).to_csv(index=False)
+
+    def ingest_price_ticks(self, df: pd.DataFrame, schema_version: int = history_store.SCHEMA_VERSION) -> int:
+        return 0
+
+    def has_ticks(self) -> bool:
+        return False
+
+    def load_price_ticks(self, start=None, end=None, names: Optional[List[str]] = None) -> pd.DataFrame:
+        return pd.DataFrame()
+
+
+class CsvStorage(Storage):
+    """
+    Un CSV par table. Tables à clé : les écritures ligne à ligne vont dans le journal
+    (coût proportionnel au changement) ; un remplacement complet ou la compaction réécrit le CSV.
+    """
+
+    backend = "csv"
+
+    def _read_snapshot(self, table: str) -> pd.DataFrame:
+        try:
+            return pd.read_csv(self.csv_path(table))
+        except Exception:
+            return empty_frame(table)
+
+    def _read_journal(self, table: str) -> List[dict]:
+        path = self.journal_path(table)
+        if not journaled(table) or not os.path.isfile(path):
+            return []
+        events = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # ligne tronquée (arrêt en pleine écriture)
+        return events
+
+    def load(self, table: str) -> pd.DataFrame:
+        snapshot = self._read_snapshot(table)
+        if not journaled(table):
+            return snapshot
+        return fold_journal(snapshot, self._read_journal(table), TABLES[table]["key"])
+
+    def _append_events(self, table: str, events: List[dict]):
+        path = self.journal_path(table)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in events))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self, table: str, df: pd.DataFrame) -> List[str]:
+        write_text_atomic(self.csv_path(table), df.to_csv(index=False))
+        paths = [self.csv_path(table)]
+        if journaled(table) and os.path.isfile(self.journal_path(table)):
+            write_text_atomic(self.journal_path(table), "")
+            paths.append(self.journal_path(table))
+        return paths
+
+    def compact(self, table: str) -> List[str]:
+        """Replie le journal dans le CSV puis le vide ; renvoie les fichiers réécrits."""
+        with file_lock(self.csv_path(table)):
+            if not self._read_journal(table):
+                return []
+            return self._rewrite(table, self.load(table))
+
+    def write(self, insert=None, delete=None, replace=None):
+        touched = list(dict.fromkeys([*(replace or {}), *(delete or {}), *(insert or {})]))
+        changed = []
+        for table in touched:
+            with file_lock(self.csv_path(table)):
+                if (replace and table in replace) or not journaled(table):
+                    df = replace[table] if replace and table in replace else self.load(table)
+                    if delete and table in delete:
+                        key = TABLES[table]["key"]
+                        df = df[~df[key].astype(str).isin([str(k) for k in delete[table]])]
+                    if insert and table in insert:
+                        df = pd.concat([df, insert[table]], ignore_index=True)
+                    changed += self._rewrite(table, df)
+                    continue
+                now = pd.Timestamp.now(tz="UTC").isoformat()
+                events = [{"op": "del", "key": str(k), "at": now} for k in (delete or {}).get(table, [])]
+                if insert and table in insert:
+                    events += [{"op": "add", "row": row, "at": now} for row in _records(insert[table])]
+                self._append_events(table, events)
+                changed.append(self.journal_path(table))
+            if JOURNAL_COMPACT_EVERY and len(self._read_journal(table)) >= JOURNAL_COMPACT_EVERY:
+                changed += self.compact(table)
+        return list(dict.fromkeys(changed))
+
+
+class SqliteStorage(Storage):
+    """
+    Une base par profil. Une connexion par opération (le writer GitHub lit depuis son thread),
+    WAL pour que les lectures ne bloquent pas l'écriture.
+    """
+
+    backend = "sqlite"
+    supports_ticks = True
+
+    def __init__(self, data_dir: str):
+        super().__init__(data_dir)
+        self.db_path = os.path.join(data_dir, DB_NAME)
+        os.makedirs(data_dir, exist_ok=True)
+        with self._conn() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(con)
+            self._seed_from_csv(con)
+
+    @contextlib.contextmanager
+    def _conn(self):
+        con = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with con:  # transaction : commit en sortie, rollback sur exception
+                yield con
+        finally:
+            con.close()
+
+    def _create_schema(self, con):
+        con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        for table, spec in TABLES.items():
+            cols = ", ".join(f"{_q(c)} {t}" for c, t in spec["columns"])
+            con.execute(f"CREATE TABLE IF NOT EXISTS {_q(table)} ({cols})")
+            if spec["key"]:
+                con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_q('ux_' + table + '_' + spec['key'])} "
+                            f"ON {_q(table)} ({_q(spec['key'])})")
+            for idx in spec["indexes"]:
+                con.execute(f"CREATE INDEX IF NOT EXISTS {_q('ix_' + table + '_' + '_'.join(idx))} "
+                            f"ON {_q(table)} ({', '.join(_q(c) for c in idx)})")
+        con.execute("""CREATE TABLE IF NOT EXISTS price_ticks (
+            market_hash_name TEXT NOT NULL, ts INTEGER NOT NULL, price_cents INTEGER NOT NULL,
+            min_all_cents INTEGER, median_cents INTEGER, listing_count INTEGER,
+            PRIMARY KEY (market_hash_name, ts)) WITHOUT ROWID""")
+        con.execute("CREATE INDEX IF NOT EXISTS ix_price_ticks_ts ON price_ticks (ts)")
+
+    def _seed_from_csv(self, con):
+        """Import unique de chaque CSV existant (marqué dans meta : une table vidée n'est pas réimportée)."""
+        for table in TABLES:
+            flag = f"seeded:{table}"
+            if con.execute("SELECT 1 FROM meta WHERE key = ?", (flag,)).fetchone():
+                continue
+            if os.path.isfile(self.csv_path(table)):
+                self._insert(con, table, CsvStorage(self.data_dir).load(table))
+            con.execute("INSERT INTO meta (key, value) VALUES (?, '1')", (flag,))
+
+    def _ensure_columns(self, con, table: str, cols: Iterable[str]):
+        known = {r[1] for r in con.execute(f"PRAGMA table_info({_q(table)})")}
+        for c in cols:
+            if c not in known:
+                con.execute(f"ALTER TABLE {_q(table)} ADD COLUMN {_q(c)}")
+
+    def _insert(self, con, table: str, df: pd.DataFrame):
+        if df is None or df.empty:
+            return
+        self._ensure_columns(con, table, df.columns)
+        cols = list(df.columns)
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        verb = "INSERT OR REPLACE" if TABLES[table]["key"] else "INSERT"
+        con.executemany(f"{verb} INTO {_q(table)} ({', '.join(_q(c) for c in cols)}) "
+                        f"VALUES ({', '.join('?' * len(cols))})", rows)
+
+    def load(self, table: str) -> pd.DataFrame:
+        with self._conn() as con:
+            df = pd.read_sql_query(f"SELECT * FROM {_q(table)} ORDER BY rowid", con)
+        return df
+
+    def write(self, insert=None, delete=None, replace=None):
+        with self._conn() as con:
+            for table, df in (replace or {}).items():
+                con.execute(f"DELETE FROM {_q(table)}")
+                self._insert(con, table, df)
+            for table, keys in (delete or {}).items():
+                key = TABLES[table]["key"]
+                con.executemany(f"DELETE FROM {_q(table)} WHERE {_q(key)} = ?", [(str(k),) for k in keys])
+            for table, df in (insert or {}).items():
+                self._insert(con, table, df)
+        mirrors = []
+        for table in dict.fromkeys([*(replace or {}), *(delete or {}), *(insert or {})]):
+            mirrors.append(self.csv_path(table))
+            if journaled(table):
+                mirrors.append(self.journal_path(table))  # poussé vide : le CSV exporté contient tout
+        return mirrors
+
+    # ---------- ticks de prix ----------
+    def ingest_price_ticks(self, df: pd.DataFrame, schema_version: int = history_store.SCHEMA_VERSION) -> int:
+        """Ajoute les ticks (format price_history, schéma `schema_version`) absents ; renvoie le nombre de lignes nouvelles."""
+        ticks = history_store.normalize_frame(df, schema_version)
+        if ticks.empty:
+            return 0
+        cols = ["market_hash_name", "ts"] + history_store.INT_COLUMNS
+        rows = ticks[cols].astype(object).where(ticks[cols].notna(), None).itertuples(index=False, name=None)
+        with self._conn() as con:
+            before = con.total_changes
+            con.executemany(f"INSERT OR IGNORE INTO price_ticks ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})", rows)
+            return con.total_changes - before
+
+    def has_ticks(self) -> bool:
+        with self._conn() as con:
+            return con.execute("SELECT 1 FROM price_ticks LIMIT 1").fetchone() is not None
+
+    def load_price_ticks(self, start=None, end=None, names: Optional[List[str]] = None) -> pd.DataFrame:
+        where, params = [], []
+        if start is not None:
+            where.append("ts >= ?"); params.append(int(pd.Timestamp(start, tz="UTC").timestamp()))
+        if end is not None:
+            where.append("ts <= ?"); params.append(int(pd.Timestamp(end, tz="UTC").timestamp()))
+        if names:
+            where.append(f"market_hash_name IN ({', '.join('?' * len(names))})"); params.extend(names)
+        sql = "SELECT ts, market_hash_name, price_cents FROM price_ticks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._conn() as con:
+            frame = pd.read_sql_query(sql + " ORDER BY ts", con, params=params)
+        if frame.empty:
+            return pd.DataFrame()
+        return history_store.to_history_frame(frame)
+
+
+_OPEN: Dict[tuple, Storage] = {}
+_OPEN_LOCK = threading.Lock()
+
+
+def open_storage(data_dir: str, backend: str = "csv") -> Storage:
+    """Instance partagée par (dossier, backend)."""
+    backend = (backend or "csv").strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+    key = (os.path.normpath(data_dir), backend)
+    with _OPEN_LOCK:
+        if key not in _OPEN:
+            _OPEN[key] = SqliteStorage(data_dir) if backend == "sqlite" else CsvStorage(data_dir)
+        return _OPEN[key]
+
+
+def read_mirror(path: str) -> Optional[str]:
+    """Contenu à pousser pour un fichier miroir : export de la base si un backend SQLite le gère, sinon le fichier."""
+    data_dir, name = os.path.split(os.path.normpath(path))
+    store = _OPEN.get((data_dir, "sqlite"))
+    if store is not None:
+        for table, spec in TABLES.items():
+            if name == spec["file"]:
+                return store.export_csv(table)
+            if journaled(table) and name == os.path.basename(store.journal_path(table)):
+                return ""
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _profile_dirs(paths: List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if any(os.path.isfile(os.path.join(p, spec["file"])) for spec in TABLES.values()):
+            out.append(p)
+        elif os.path.isdir(p):
+            out += [os.path.join(p, d) for d in sorted(os.listdir(p)) if os.path.isdir(os.path.join(p, d))]
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description="Maintenance du stockage local des profils")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("compact", help="replie les journaux trades / finances dans leurs CSV")
+    c.add_argument("paths", nargs="+", help="dossier data/<profil> ou racine data/")
+    args = p.parse_args()
+
+    dirs = _profile_dirs(args.paths)
+    if not dirs:
+        print(f"[WARN] aucun profil trouvé dans {args.paths}")
+        sys.exit(0)
+    for d in dirs:
+        store = CsvStorage(d)
+        for table in TABLES:
+            if journaled(table):
+                events = len(store._read_journal(table))
+                if store.compact(table):
+                    print(f"[COMPACT] {store.csv_path(table)}: {events} événements repliés")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Stub Server
+
+Serveur local qui remplace CSFloat, Steam et l'API GitHub (contents + Git Data) pour
+tester / benchmarker sans clés : rejoue les réponses enregistrées de
+fixtures/, avec latence et erreurs 429 / 5xx injectables.
+
+Usage:
+    python stub_server.py --port 8765 --latency-ms 80 --rate-429 0.05 --rate-5xx 0.02
+
+Puis pointer les clients dessus :
+    CSFLOAT_API_BASE=http://127.0.0.1:8765 STEAM_API_BASE=http://127.0.0.1:8765 \\
+    STEAM_COMMUNITY_BASE=http://127.0.0.1:8765 python fetch_prices.py data/
+    (app : GITHUB_API_BASE / CSFLOAT_API_BASE dans st.secrets ou l'environnement)
+
+Git Data (ref / blobs / trees / commits / PATCH ref) : assez pour un commit multi-fichiers,
+avec 422 si la branche a bougé entre-temps (pas de fast-forward).
+
+GET /__stats renvoie les compteurs (requêtes, erreurs injectées) en JSON.
+"""
+
+import os
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _load_fixture(name: str) -> dict:
+    path = os.path.join(FIXTURES_DIR, name)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def git_blob_sha(content: bytes) -> str:
+    """SHA d'un blob git (identique à celui renvoyé par GitHub)."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def synth_listings(name: str, limit: int) -> list:
+    """Annonces déterministes pour un item absent des fixtures (prix dérivé du nom)."""
+    seed = int(hashlib.md5(name.encode("utf-8")).hexdigest()[:8], 16)
+    base = 50 + seed % 20000
+    out = []
+    for i in range(max(1, limit)):
+        out.append({
+            "id": str(seed + i),
+            "type": "auction" if i % 5 == 4 else "buy_now",
+            "price": base + i * (1 + seed % 37),
+            "item": {"market_hash_name": name},
+        })
+    return out
+
+
+class StubState:
+    """Fixtures + options d'injection + compteurs, partagés entre les threads du serveur."""
+
+    def __init__(self, root: str, latency_ms: float, rate_429: float, rate_5xx: float,
+                 retry_after: int, persist: bool):
+        self.root = root
+        self.latency = latency_ms / 1000.0
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.persist = persist
+        self.listings = _load_fixture("csfloat_listings.json")
+        self.inventories = _load_fixture("steam_inventory.json")
+        self.vanity = _load_fixture("steam_resolve_vanity.json")
+        self.overlay = {}        # chemin repo -> contenu écrit via PUT (si pas --persist)
+        self.lock = threading.Lock()
+        # Git Data : chaque commit ne garde que les fichiers qu'il modifie (suffisant pour le stub)
+        self.blobs = {}          # sha -> contenu
+        self.trees = {}          # sha -> {chemin: contenu}
+        self.commits = {}        # sha -> {"tree": sha, "parents": [...]}
+        self.head = self.new_commit({}, [], "initial")
+        self.stats = {"requests": 0, "injected_429": 0, "injected_5xx": 0, "by_route": {}}
+
+    def count(self, key: str, route: str = None):
+        with self.lock:
+            self.stats[key] += 1
+            if route:
+                self.stats["by_route"][route] = self.stats["by_route"].get(route, 0) + 1
+
+    def read_repo_file(self, path: str):
+        with self.lock:
+            if path in self.overlay:
+                return self.overlay[path]
+        full = os.path.join(self.root, path)
+        if not os.path.isfile(full):
+            return None
+        with open(full, "rb") as f:
+            return f.read()
+
+    def new_commit(self, changes: dict, parents: list, message: str) -> str:
+        tree = hashlib.sha1(repr(sorted(changes.items())).encode() + str(time.time()).encode()).hexdigest()
+        sha = hashlib.sha1(tree.encode() + repr(parents).encode() + message.encode()).hexdigest()
+        with self.lock:
+            self.trees[tree] = dict(changes)
+            self.commits[sha] = {"tree": tree, "parents": list(parents), "message": message}
+        return sha
+
+    def write_repo_file(self, path: str, content: bytes):
+        if self.persist:
+            full = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "wb") as f:
+                f.write(content)
+        else:
+            with self.lock:
+                self.overlay[path] = content
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "cs2portfolio-stub/1.0"
+    state: StubState = None
+
+    def log_message(self, fmt, *args):
+        pass  # silencieux ; /__stats pour les compteurs
+
+    # ---------- plomberie ----------
+    def _send_json(self, status: int, payload, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_raw(self, status: int, body: bytes, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _inject(self, route: str) -> bool:
+        """Latence + erreurs aléatoires ; True si une erreur a été envoyée."""
+        st = self.state
+        st.count("requests", route)
+        if st.latency:
+            time.sleep(st.latency)
+        roll = random.random()
+        if roll < st.rate_429:
+            st.count("injected_429")
+            self._send_json(429, {"message": "Too Many Requests"}, {"Retry-After": str(st.retry_after)})
+            return True
+        if roll < st.rate_429 + st.rate_5xx:
+            st.count("injected_5xx")
+            self._send_json(random.choice([500, 502, 503]), {"message": "Server Error"})
+            return True
+        return False
+
+    # ---------- routes ----------
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+
+        if url.path == "/__stats":
+            with self.state.lock:
+                return self._send_json(200, self.state.stats)
+
+        if url.path == "/api/v1/listings":
+            if self._inject("csfloat_listings"):
+                return
+            name = q.get("market_hash_name", "")
+            limit = int(q.get("limit", 1))
+            listings = list(self.state.listings.get(name) or synth_listings(name, limit))
+            if q.get("type"):
+                listings = [l for l in listings if l.get("type") == q["type"]]
+            listings.sort(key=lambda l: l.get("price", 0))
+            return self._send_json(200, {"data": listings[:limit]})
+
+        if url.path.startswith("/ISteamUser/ResolveVanityURL"):
+            if self._inject("steam_resolve_vanity"):
+                return
+            payload = self.state.vanity.get(q.get("vanityurl", ""))
+            return self._send_json(200, payload or {"response": {"success": 42, "message": "No match"}})
+
+        if url.path.startswith("/ISteamUser/GetPlayerSummaries"):
+            if self._inject("steam_player_summaries"):
+                return
+            return self._send_json(200, {"response": {"players": []}})
+
+        if len(parts) >= 2 and parts[0] == "inventory":
+            if self._inject("steam_inventory"):
+                return
+            inv = self.state.inventories.get(parts[1])
+            if inv is None:
+                return self._send_json(403, None)
+            return self._send_json(200, inv)
+
+        # /repos/{owner}/{repo}/git/ref/heads/{branch} et /git/commits/{sha}
+        if len(parts) >= 6 and parts[0] == "repos" and parts[3] == "git":
+            if self._inject("github_git_get"):
+                return
+            if parts[4] == "ref":
+                return self._send_json(200, {"ref": "refs/" + "/".join(parts[5:]),
+                                             "object": {"type": "commit", "sha": self.state.head}})
+            if parts[4] == "commits" and parts[5] in self.state.commits:
+                c = self.state.commits[parts[5]]
+                return self._send_json(200, {"sha": parts[5], "tree": {"sha": c["tree"]},
+                                             "parents": [{"sha": p} for p in c["parents"]]})
+            return self._send_json(404, {"message": "Not Found"})
+
+        # /repos/{owner}/{repo}/contents/{path}
+        if len(parts) >= 5 and parts[0] == "repos" and parts[3] == "contents":
+            if self._inject("github_contents_get"):
+                return
+            path = "/".join(parts[4:])
+            full = os.path.join(self.state.root, path)
+            if os.path.isdir(full):
+                entries = []
+                for n in sorted(os.listdir(full)):
+                    if os.path.isdir(os.path.join(full, n)):
+                        entries.append({"name": n, "path": f"{path}/{n}", "type": "dir"})
+                    else:
+                        blob = self.state.read_repo_file(f"{path}/{n}") or b""
+                        entries.append({"name": n, "path": f"{path}/{n}", "type": "file",
+                                        "sha": git_blob_sha(blob), "size": len(blob)})
+                etag = f'W/"{git_blob_sha(json.dumps(entries, sort_keys=True).encode())}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                return self._send_json(200, entries, {"ETag": etag})
+            content = self.state.read_repo_file(path)
+            if content is None:
+                return self._send_json(404, {"message": "Not Found"})
+            if "raw" in (self.headers.get("Accept") or ""):
+                etag = f'"{git_blob_sha(content)}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                rng = self.headers.get("Range") or ""
+                if rng.startswith("bytes=") and rng.endswith("-") and rng[6:-1].isdigit():
+                    start = int(rng[6:-1])
+                    if start >= len(content) and content:
+                        return self._send_json(416, {"message": "Range Not Satisfiable"},
+                                               {"Content-Range": f"bytes */{len(content)}"})
+                    return self._send_raw(206, content[start:], {
+                        "ETag": etag, "Content-Range": f"bytes {start}-{max(start, len(content) - 1)}/{len(content)}"})
+                return self._send_raw(200, content, {"ETag": etag})
+            return self._send_json(200, {
+                "type": "file", "path": path, "name": parts[-1], "size": len(content),
+                "sha": git_blob_sha(content), "encoding": "base64",
+                "content": base64.b64encode(content).decode("ascii"),
+            })
+
+        self._send_json(404, {"message": f"stub: route inconnue {url.path}"})
+
+    def do_PUT(self):
+        parts = [unquote(p) for p in urlparse(self.path).path.strip("/").split("/")]
+        if len(parts) >= 5 and parts[0] == "repos" and parts[3] == "contents":
+            if self._inject("github_contents_put"):
+                return
+            path = "/".join(parts[4:])
+            payload = json.loads(self._read_body() or b"{}")
+            current = self.state.read_repo_file(path)
+            if current is not None and payload.get("sha") != git_blob_sha(current):
+                return self._send_json(409, {"message": f"{path} does not match {payload.get('sha')}"})
+            content = base64.b64decode(payload.get("content", ""))
+            self.state.write_repo_file(path, content)
+            sha = git_blob_sha(content)
+            commit = self.state.new_commit({path: content}, [self.state.head], payload.get("message", ""))
+            self.state.head = commit
+            return self._send_json(201 if current is None else 200, {
+                "content": {"path": path, "sha": sha},
+                "commit": {"sha": commit, "tree": {"sha": self.state.commits[commit]["tree"]},
+                           "message": payload.get("message", "")},
+            })
+        self._send_json(404, {"message": "stub: route inconnue"})
+
+    def do_PATCH(self):
+        parts = [unquote(p) for p in urlparse(self.path).path.strip("/").split("/")]
+        # /repos/{owner}/{repo}/git/refs/heads/{branch} : avance la branche (fast-forward seulement)
+        if len(parts) >= 6 and parts[0] == "repos" and parts[3] == "git" and parts[4] == "refs":
+            if self._inject("github_git_ref"):
+                return
+            payload = json.loads(self._read_body() or b"{}")
+            st = self.state
+            commit = st.commits.get(payload.get("sha"))
+            if commit is None:
+                return self._send_json(422, {"message": "Object does not exist"})
+            if not payload.get("force") and st.head not in commit["parents"]:
+                return self._send_json(422, {"message": "Update is not a fast forward"})
+            for path, content in st.trees[commit["tree"]].items():
+                st.write_repo_file(path, content)
+            st.head = payload["sha"]
+            return self._send_json(200, {"ref": "refs/" + "/".join(parts[5:]),
+                                         "object": {"type": "commit", "sha": st.head}})
+        self._send_json(404, {"message": "stub: route inconnue"})
+
+    def do_POST(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+        # /repos/{owner}/{repo}/git/{blobs,trees,commits}
+        if len(parts) == 5 and parts[0] == "repos" and parts[3] == "git":
+            if self._inject("github_git_post"):
+                return
+            return self._git_create(parts[4], json.loads(self._read_body() or b"{}"))
+        # /repos/{owner}/{repo}/actions/workflows/{file}/dispatches
+        if len(parts) >= 7 and parts[0] == "repos" and parts[-1] == "dispatches":
+            if self._inject("github_dispatch"):
+                return
+            self.send_response(204)
+            self.end_headers()
+            return
+        self._send_json(404, {"message": "stub: route inconnue"})
+
+
+    def _git_create(self, kind: str, payload: dict):
+        st = self.state
+        if kind == "blobs":
+            raw = payload.get("content", "")
+            content = base64.b64decode(raw) if payload.get("encoding") == "base64" else raw.encode("utf-8")
+            sha = git_blob_sha(content)
+            with st.lock:
+                st.blobs[sha] = content
+            return self._send_json(201, {"sha": sha})
+        if kind == "trees":
+            changes = {}  # base_tree ignoré : le commit n'applique que ses propres fichiers
+            for e in payload.get("tree", []):
+                if "content" in e:
+                    changes[e["path"]] = e["content"].encode("utf-8")
+                elif e.get("sha") in st.blobs:
+                    changes[e["path"]] = st.blobs[e["sha"]]
+                else:
+                    return self._send_json(422, {"message": f"blob inconnu pour {e.get('path')}"})
+            sha = hashlib.sha1(repr(sorted(changes.items())).encode() + str(time.time()).encode()).hexdigest()
+            with st.lock:
+                st.trees[sha] = changes
+            return self._send_json(201, {"sha": sha, "tree": [
+                {"path": p, "type": "blob", "sha": git_blob_sha(c)} for p, c in sorted(changes.items())]})
+        if kind == "commits":
+            tree = payload.get("tree")
+            if tree not in st.trees:
+                return self._send_json(422, {"message": "Tree SHA does not exist"})
+            sha = hashlib.sha1(tree.encode() + repr(payload.get("parents")).encode()
+                               + payload.get("message", "").encode()).hexdigest()
+            with st.lock:
+                st.commits[sha] = {"tree": tree, "parents": list(payload.get("parents", [])),
+                                   "message": payload.get("message", "")}
+            return self._send_json(201, {"sha": sha, "tree": {"sha": tree}})
+        return self._send_json(404, {"message": "stub: route inconnue"})
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, root: str = ".", latency_ms: float = 0.0,
+                rate_429: float = 0.0, rate_5xx: float = 0.0, retry_after: int = 1,
+                persist: bool = False) -> ThreadingHTTPServer:
+    """Construit le serveur (port=0 -> port libre, lisible via server.server_address)."""
+    handler = type("BoundStubHandler", (StubHandler,), {})
+    handler.state = StubState(root, latency_ms, rate_429, rate_5xx, retry_after, persist)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Stub local CSFloat / Steam / GitHub")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--root", default=".", help="racine du repo servie par l'API contents (défaut: .)")
+    p.add_argument("--latency-ms", type=float, default=0.0, help="latence ajoutée à chaque réponse")
+    p.add_argument("--rate-429", type=float, default=0.0, help="proportion de réponses 429 injectées")
+    p.add_argument("--rate-5xx", type=float, default=0.0, help="proportion de réponses 5xx injectées")
+    p.add_argument("--retry-after", type=int, default=1, help="valeur du header Retry-After des 429")
+    p.add_argument("--persist", action="store_true", help="écrire les PUT GitHub sur disque (sinon en mémoire)")
+    args = p.parse_args()
+
+    srv = make_server(args.host, args.port, args.root, args.latency_ms,
+                      args.rate_429, args.rate_5xx, args.retry_after, args.persist)
+    print(f"[STUB] écoute sur http://{args.host}:{srv.server_address[1]} "
+          f"(latence={args.latency_ms}ms, 429={args.rate_429:.0%}, 5xx={args.rate_5xx:.0%})")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cashflow
+
+
+def _frames(seed, n=300):
+    rng = np.random.default_rng(seed)
+    dates = (pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 90, n), unit="D")).strftime("%Y-%m-%d")
+    dates = np.where(rng.random(n) < 0.05, None, dates)  # dates illisibles : lifetime seulement
+    fin = pd.DataFrame({"date": dates, "type": rng.choice(["DEPOSIT", "WITHDRAW", "FEE", "deposit"], n),
+                        "amount_usd": np.round(rng.uniform(1, 500, n), 2)})
+    trades = pd.DataFrame({"date": dates[::-1], "type": rng.choice(["BUY", "SELL"], n),
+                           "qty": rng.integers(1, 4, n), "price_usd": np.round(rng.uniform(1, 80, n), 2)})
+    return fin, trades
+
+
+def _legacy(fin, trades, snapshot_date):
+    """Anciennes sommes de compute_financials (apply ligne par ligne, filtre des trades à chaque rerun)."""
+    td = trades.copy()
+    td["date"] = pd.to_datetime(td["date"], errors="coerce")
+    if snapshot_date is not None:
+        td = td[td["date"] >= snapshot_date]
+    buys = (td[td["type"] == "BUY"]["qty"] * td[td["type"] == "BUY"]["price_usd"]).sum()
+    sells = (td[td["type"] == "SELL"]["qty"] * td[td["type"] == "SELL"]["price_usd"]).sum()
+    fin = fin.copy()
+    fin["date"] = pd.to_datetime(fin["date"], errors="coerce")
+
+    def _mov_sum(df):
+        if df.empty:
+            return 0.0
+        return df.apply(lambda r: r["amount_usd"] if r.get("type") == "DEPOSIT"
+                        else (-r["amount_usd"] if r.get("type") == "WITHDRAW" else 0.0), axis=1).sum()
+
+    mov_all = _mov_sum(fin)
+    mov_since = _mov_sum(fin[fin["date"] >= snapshot_date]) if snapshot_date is not None else mov_all
+    return buys, sells, mov_all, mov_since
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("snapshot", [None, "2025-12-01", "2026-01-01", "2026-02-15", "2026-03-31", "2026-06-01"])
+def test_finance_book_matches_row_by_row_sums(seed, snapshot):
+    fin, trades = _frames(seed)
+    snapshot = pd.Timestamp(snapshot) if snapshot else None
+    book = cashflow.FinanceBook()
+    book.sync(fin, trades)
+
+    buys, sells, mov_all, mov_since = _legacy(fin, trades, snapshot)
+    assert book.buys_since(snapshot) == pytest.approx(buys)
+    assert book.sells_since(snapshot) == pytest.approx(sells)
+    assert book.movements.total == pytest.approx(mov_all)
+    assert book.movements_since(snapshot) == pytest.approx(mov_since)
+
+
+def test_finance_book_rebuilds_only_on_change():
+    fin, trades = _frames(0)
+    book = cashflow.FinanceBook()
+    assert book.sync(fin, trades)
+    assert not book.sync(fin.copy(), trades.copy())
+    fin.loc[0, "amount_usd"] += 1
+    assert book.sync(fin, trades)
+
+
+def test_cash_flows_until_and_series():
+    flows = cashflow.CashFlows(["2026-01-02", "2026-01-01", None, "2026-01-02"], [1.0, 2.0, 4.0, 8.0])
+    assert flows.total == 15.0
+    assert flows.until("2026-01-01") == 2.0
+    assert flows.since("2026-01-02") == 9.0
+    assert flows.series().tolist() == [2.0, 11.0]
@@ -0,0 +1,42 @@
+import pandas as pd
+
+import compact_history
+import history_store
+
+
+def _history(tmp_path, days):
+    path = tmp_path / "price_history.csv"
+    ts = pd.date_range("2026-09-01 07:00", periods=days, freq="D", tz="UTC")
+    pd.DataFrame({
+        "ts_utc": ts.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "market_hash_name": "A",
+        "price_cents": range(100, 100 + days),
+        "price_usd": [f"{c / 100:.2f}" for c in range(100, 100 + days)],
+    }).to_csv(path, index=False)
+    history_store.write_schema(str(path))
+    return path
+
+
+def test_raw_ticks_are_pruned_in_steps(tmp_path):
+    path = _history(tmp_path, 40)
+    before = path.read_bytes()
+
+    # plus ancien tick à 33 jours : sous raw_days + prune_step, le CSV n'est pas réécrit
+    res = compact_history.compact(str(path), raw_days=30, today="2026-10-04", prune_step=7)
+    assert res["ticks_dropped"] == 0
+    assert path.read_bytes() == before
+
+    # à 38 jours : coupé à la rétention exacte
+    res = compact_history.compact(str(path), raw_days=30, today="2026-10-09", prune_step=7)
+    kept = pd.read_csv(path)
+    assert res["ticks_dropped"] == 8
+    assert kept["ts_utc"].iloc[0].startswith("2026-09-09")
+
+    bars = compact_history.read_bars(compact_history.bars_path(str(path)))
+    assert len(bars) == 40 and bars["date"].iloc[0] == "2026-09-01"
+
+
+def test_prune_step_zero_prunes_every_day(tmp_path):
+    path = _history(tmp_path, 32)
+    res = compact_history.compact(str(path), raw_days=30, today="2026-10-03", prune_step=0)
+    assert res["ticks_dropped"] == 2
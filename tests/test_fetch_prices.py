@@ -0,0 +1,87 @@
+import datetime
+import os
+import threading
+
+import pytest
+
+import fetch_prices
+import stub_server
+
+
+def _ts(hours_ago):
+    when = datetime.datetime.utcnow() - datetime.timedelta(hours=hours_ago)
+    return when.replace(microsecond=0).isoformat() + "Z"
+
+
+def test_recent_checkpoint_is_resumed(tmp_path):
+    ckpt = fetch_prices.RunCheckpoint(str(tmp_path / "ckpt.jsonl"))
+    ckpt.start(_ts(2), ["A", "B", "C"])
+    ckpt.mark_done(["B"])
+
+    again = fetch_prices.RunCheckpoint(ckpt.path)
+    assert again.load()
+    assert again.remaining() == ["A", "C"]
+
+
+def test_checkpoint_older_than_one_run_interval_is_dropped(tmp_path):
+    ckpt = fetch_prices.RunCheckpoint(str(tmp_path / "ckpt.jsonl"), max_age_h=12)
+    ckpt.start(_ts(13), ["A", "B"])
+
+    again = fetch_prices.RunCheckpoint(ckpt.path, max_age_h=12)
+    assert not again.load()
+    assert again.ts is None and again.remaining() == []
+    assert not (tmp_path / "ckpt.jsonl").exists()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    srv = stub_server.make_server(port=0, root=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(fetch_prices, "CSFLOAT_API_KEY", "x")
+    monkeypatch.setattr(fetch_prices, "CSFLOAT_API", f"http://127.0.0.1:{srv.server_address[1]}/api/v1/listings")
+    calls = []
+    get = fetch_prices._get_listings
+    monkeypatch.setattr(fetch_prices, "_get_listings", lambda params: calls.append(params) or get(params))
+    yield srv.RequestHandlerClass.state.listings, calls
+    srv.shutdown()
+    srv.server_close()
+
+
+def _listing(price, kind):
+    return {"price": price, "type": kind}
+
+
+def test_topk_full_of_auctions_looks_further_for_buy_now(stub):
+    listings, calls = stub
+    listings["A"] = [_listing(p, "auction") for p in (100, 110, 120)] + [_listing(900, "buy_now")]
+    stats = fetch_prices.fetch_topk_stats("A", 3)
+    assert stats["price_cents"] == 900 and stats["min_all_cents"] == 100
+    assert len(calls) == 2 and calls[1]["type"] == "buy_now"
+
+
+def test_topk_falls_back_to_all_types_only_without_any_buy_now(stub):
+    listings, calls = stub
+    listings["A"] = [_listing(p, "auction") for p in (100, 110, 120)]
+    assert fetch_prices.fetch_topk_stats("A", 3)["price_cents"] == 100  # confirmé par le 2e appel
+    assert len(calls) == 2
+    assert fetch_prices.fetch_topk_stats("A", 5)["price_cents"] == 100  # page incomplète : tout est vu
+    assert len(calls) == 3
+
+
+def test_topk_price_left_empty_when_buy_now_lookup_fails(stub, monkeypatch):
+    listings, _ = stub
+    listings["A"] = [_listing(p, "auction") for p in (100, 110, 120)]
+    get = fetch_prices._get_listings
+    monkeypatch.setattr(fetch_prices, "_get_listings", lambda params: None if "type" in params else get(params))
+    stats = fetch_prices.fetch_topk_stats("A", 3)
+    assert stats["price_cents"] is None and stats["price_usd"] is None
+    assert stats["min_all_cents"] == 100
+
+
+def test_appended_rows_use_the_rewritten_file_line_endings(tmp_path):
+    path = str(tmp_path / "price_history.csv")
+    row = {"ts_utc": "2026-10-17T07:00:00Z", "market_hash_name": "A", "price_cents": 120, "price_usd": 1.2}
+    fetch_prices.append_history(path, [row])
+    fetch_prices.append_history(path, [{**row, "ts_utc": "2026-10-17T19:00:00Z"}])
+    data = open(path, "rb").read()
+    assert b"\r" not in data and data.count(b"\n") == 3
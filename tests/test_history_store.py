@@ -0,0 +1,39 @@
+import pandas as pd
+
+import compact_history
+import history_store
+import valuation
+
+
+def _drop_frame():
+    """Vraie chute de prix : 5000 cents pendant trois runs, puis 120."""
+    return pd.DataFrame({
+        "ts_utc": ["2026-10-01T07:00:00Z", "2026-10-02T07:00:00Z", "2026-10-03T07:00:00Z", "2026-10-04T07:00:00Z"],
+        "market_hash_name": ["A"] * 4,
+        "price_cents": ["5000", "5000", "5000", "120"],
+        "price_usd": ["50.00", "50.00", "50.00", "1.20"],
+    })
+
+
+def test_schema_v2_prices_are_taken_as_is():
+    frame = history_store.normalize_frame(_drop_frame())
+    assert frame["price_cents"].tolist() == [5000, 5000, 5000, 120]
+
+
+def test_schema_v1_keeps_the_unit_heuristic():
+    legacy = _drop_frame().assign(price_cents=["5000", "5000", "50.00", "50"])
+    frame = history_store.normalize_frame(legacy, schema_version=1)
+    assert frame["price_cents"].tolist() == [5000, 5000, 5000, 5000]
+
+
+def test_v2_file_readers_do_not_rescale(tmp_path):
+    path = tmp_path / "price_history.csv"
+    _drop_frame().to_csv(path, index=False)
+    history_store.write_schema(str(path))
+
+    compact_history.compact(str(path), raw_days=0, today="2026-10-05")
+    bars = compact_history.read_bars(compact_history.bars_path(str(path)))
+    assert bars["close_cents"].tolist() == [5000, 5000, 5000, 120]
+
+    prices = valuation.profile_prices(str(tmp_path))
+    assert prices["price_usd"].tolist() == [50.0, 50.0, 50.0, 1.2]
@@ -0,0 +1,61 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    status = 503
+    hits = []
+
+    def _reply(self):
+        type(self).hits.append(self.command)
+        self.send_response(self.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_POST = do_PATCH = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.0)
+    _Handler.hits = []
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}/"
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.mark.parametrize("status,method,idempotent,hits", [
+    (503, "GET", None, 3),
+    (503, "POST", None, 1),
+    (503, "PATCH", None, 1),
+    (503, "POST", True, 3),
+    (429, "POST", None, 3),
+])
+def test_retries_depend_on_idempotence(server, monkeypatch, status, method, idempotent, hits):
+    monkeypatch.setattr(_Handler, "status", status)
+    r = http_client.request(method, server, max_retries=2, idempotent=idempotent, timeout=5)
+    assert r.status_code == status
+    assert _Handler.hits == [method] * hits
+
+
+def test_post_retried_when_connection_never_opened(monkeypatch):
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.0)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # port fermé : connexion refusée avant l'envoi
+    attempts = []
+    with pytest.raises(requests.ConnectionError):
+        http_client.request("POST", f"http://127.0.0.1:{port}/", max_retries=2, timeout=5,
+                            before_attempt=lambda: attempts.append(1))
+    assert len(attempts) == 3
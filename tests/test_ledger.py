@@ -0,0 +1,148 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ledger
+
+
+def _random_trades(seed, n=120, items=4):
+    """Petits journaux : même jour fréquent, qty 0, ventes au-delà de la position, type en minuscules."""
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 12, n), unit="D")
+    return pd.DataFrame({
+        "date": days.strftime("%Y-%m-%d"),
+        "type": rng.choice(["BUY", "BUY", "SELL", "sell"], n),
+        "market_hash_name": rng.choice([f"Item {i}" for i in range(items)], n),
+        "qty": rng.choice([0, 1, 1, 2, 3, 5, 0.5], n),
+        "price_usd": np.round(rng.uniform(1, 50, n), 2),
+        "trade_id": [f"t{i}" for i in range(n)],
+    })
+
+
+def _reference(trades, method):
+    """Rejeu naïf lot par lot, item par item, dans l'ordre (date, ordre du fichier)."""
+    t = trades.assign(type=trades["type"].str.upper(), seq=np.arange(len(trades)),
+                      ts=pd.to_datetime(trades["date"]))
+    t = t[t["type"].isin(["BUY", "SELL"])].sort_values(["market_hash_name", "ts", "seq"], kind="mergesort")
+    lots, hist = [], []
+    for name, rows in t.groupby("market_hash_name", sort=True):
+        book, avg, pos, start = [], 0.0, 0.0, None  # book : [qty restante, prix, date]
+        for r in rows.itertuples():
+            q = max(float(r.qty), 0.0)
+            if r.type == "BUY":
+                if method == "average":
+                    avg = (avg * pos + r.price_usd * q) / (pos + q) if pos + q > 0 else 0.0
+                    if pos <= 0 and q > 0:
+                        start = r.date
+                    pos += q
+                elif q > 0:
+                    book.append([q, r.price_usd, r.date])
+                hist.append((r.seq, "BUY", name, q, r.price_usd, np.nan, np.nan, np.nan))
+                continue
+            if method == "average":
+                taken, unit = min(q, pos), avg
+                pos -= taken
+            else:
+                need, cost, taken = q, 0.0, 0.0
+                while need > 1e-12 and book:
+                    lot = book[0] if method == "fifo" else book[-1]
+                    use = min(lot[0], need)
+                    cost += use * lot[1]
+                    taken += use
+                    need -= use
+                    lot[0] -= use
+                    if lot[0] <= 1e-12:
+                        book.remove(lot)
+                unit = cost / taken if taken > 0 else 0.0
+            pnl = (r.price_usd - unit) * q
+            pct = pnl / (unit * q) * 100.0 if unit > 0 and q > 0 else np.nan
+            hist.append((r.seq, "SELL", name, q, unit, r.price_usd, pnl, pct))
+        if method == "average":
+            if pos > 0:
+                lots.append((name, pos, avg, start))
+        else:
+            lots.extend((name, q, p, d) for q, p, d in book)
+    lots = pd.DataFrame(lots, columns=["market_hash_name", "qty", "buy_price_usd", "buy_date"])
+    hist = pd.DataFrame(hist, columns=["seq", "type", "market_hash_name", "qty", "buy_price_usd",
+                                       "sell_price_usd", "pnl_value_usd", "pnl_pct"])
+    return lots, hist.sort_values("seq").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("method", ledger.METHODS)
+@pytest.mark.parametrize("seed", range(6))
+def test_replay_matches_per_lot_reference(method, seed):
+    trades = _random_trades(seed)
+    lots, hist = ledger.replay(ledger.normalize_trades(trades), method)
+    ref_lots, ref_hist = _reference(trades, method)
+
+    pd.testing.assert_frame_equal(lots[ref_lots.columns].reset_index(drop=True), ref_lots,
+                                  check_exact=False, check_dtype=False)
+    hist = hist.sort_values("seq").reset_index(drop=True)
+    pd.testing.assert_frame_equal(hist[ref_hist.columns], ref_hist, check_exact=False, check_dtype=False)
+
+
+def test_replay_orders_same_day_trades_by_file_order():
+    trades = pd.DataFrame({
+        "date": ["2026-01-02", "2026-01-02", "2026-01-02", "2026-01-01"],
+        "type": ["SELL", "BUY", "SELL", "BUY"],
+        "market_hash_name": ["A"] * 4,
+        "qty": [1, 1, 1, 1],
+        "price_usd": [30.0, 20.0, 40.0, 10.0],
+        "trade_id": ["s1", "b2", "s2", "b1"],
+    })
+    _, hist = ledger.replay(ledger.normalize_trades(trades), "fifo")
+    sells = hist[hist["type"] == "SELL"].set_index("trade_id")
+    assert sells.loc["s1", "buy_price_usd"] == 10.0
+    assert sells.loc["s2", "buy_price_usd"] == 20.0
+
+
+@pytest.mark.parametrize("method", ledger.METHODS)
+def test_incremental_sync_matches_full_replay(method):
+    trades = _random_trades(11, n=200, items=6)
+    eng = ledger.LedgerEngine(method)
+    for cut in (80, 81, 150, 200):
+        eng.sync(trades.iloc[:cut])
+    assert eng.stats == {"noop": 0, "incremental": 3, "full": 1}
+
+    full = ledger.LedgerEngine(method)
+    full.sync(trades)
+    pd.testing.assert_frame_equal(eng.open_lots(), full.open_lots(), check_exact=False)
+    pd.testing.assert_frame_equal(eng.trade_history(), full.trade_history(), check_exact=False)
+    assert eng.totals() == pytest.approx(full.totals())
+
+
+def test_sync_replays_everything_when_a_row_changes():
+    trades = _random_trades(3)
+    eng = ledger.LedgerEngine("fifo")
+    eng.sync(trades)
+    assert not eng.sync(trades.copy())
+    edited = trades.copy()
+    edited.loc[5, "qty"] = 7
+    assert eng.sync(edited)
+    assert eng.stats == {"noop": 1, "incremental": 0, "full": 2}
+
+
+def test_shared_engine_reads_the_journal_it_synced():
+    journals = [_random_trades(s, n=150) for s in (21, 22)]
+    expected = []
+    for trades in journals:
+        eng = ledger.LedgerEngine("fifo")
+        eng.sync(trades)
+        expected.append(eng.totals())
+    shared, errors = ledger.LedgerEngine("fifo"), []
+
+    def session(k):
+        for _ in range(30):
+            with shared.lock:
+                shared.sync(journals[k])
+                if shared.totals() != pytest.approx(expected[k]):
+                    errors.append(k)
+
+    threads = [threading.Thread(target=session, args=(k % 2,)) for k in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert not errors
@@ -0,0 +1,118 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import valuation
+
+
+def _events():
+    deltas = pd.DataFrame({
+        "market_hash_name": ["A", "B", "A", "B"],
+        "date": pd.to_datetime(["2026-08-01", "2026-08-15", "2026-09-20", "2026-10-01"]),
+        "dq": [2.0, 1.0, -1.0, 3.0],
+    })
+    days = pd.date_range("2026-08-01", "2026-10-20", freq="3D")
+    prices = pd.DataFrame({
+        "market_hash_name": np.r_[["A"] * len(days), ["B"] * len(days)],
+        "date": np.r_[days, days],
+        "price_usd": np.r_[np.linspace(10, 20, len(days)), np.linspace(5, 1, len(days))],
+    })
+    return deltas, prices
+
+
+def test_patch_series_fills_gap_of_stale_series():
+    deltas, prices = _events()
+    end = pd.Timestamp("2026-10-26")
+    full = valuation.portfolio_value(deltas, prices, end=end)
+    stale = full[full["date"] <= "2026-09-10"].reset_index(drop=True)
+
+    patched = valuation.patch_series(stale, deltas, prices, since="2026-10-17", end=end)
+
+    assert len(patched) == len(full)
+    assert (patched["date"].to_numpy() == full["date"].to_numpy()).all()
+    assert np.allclose(patched["total_value_usd"], full["total_value_usd"])
+
+
+def test_patch_series_before_kept_points_recomputes_everything():
+    deltas, prices = _events()
+    end = pd.Timestamp("2026-10-26")
+    full = valuation.portfolio_value(deltas, prices, end=end)
+    wrong = full.assign(total_value_usd=-1.0)
+
+    patched = valuation.patch_series(wrong, deltas, prices, since="2026-01-01", end=end)
+
+    assert np.allclose(patched["total_value_usd"], full["total_value_usd"])
+
+
+def test_pending_since_skips_processed_lines():
+    marks = valuation.parse_dirty('{"since": "2026-05-01"}\n{"since": "2026-03-01"}\n'
+                                  'torn\n{"since": "2026-04-01"}\n')
+    assert valuation.pending_since(marks, {}) == pd.Timestamp("2026-03-01")
+    assert valuation.pending_since(marks, {"dirty_lines": 2}) == pd.Timestamp("2026-04-01")
+    assert valuation.pending_since(marks, {"dirty_lines": 4}) is None
+    # fichier réécrit plus court que le décompte : tout est repris
+    assert valuation.pending_since(marks[:1], {"dirty_lines": 4}) == pd.Timestamp("2026-05-01")
+
+
+def test_update_profile_recomputes_from_dirty_marker(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    profile = tmp_path / "pierre"
+    shutil.copytree(os.path.join(root, "data", "pierre"), profile)
+    today = pd.Timestamp("2026-10-17")
+    valuation.update_profile(str(profile), today=today)
+
+    trades = pd.read_csv(profile / "trades.csv")
+    trades.loc[0, "qty"] = 5
+    trades.to_csv(profile / "trades.csv", index=False)
+    valuation.mark_dirty(str(profile), trades.loc[0, "date"])
+    series = valuation.update_profile(str(profile), today=today)
+
+    deltas = valuation.daily_trade_deltas(trades)
+    full = valuation.portfolio_value(deltas, valuation.profile_prices(str(profile)), end=today)
+    assert np.allclose(series["total_value_usd"], full["total_value_usd"])
+    assert valuation.read_meta(str(profile)) == {"dirty_lines": 1}
+    assert valuation.pending_since(valuation.read_dirty(str(profile)), valuation.read_meta(str(profile))) is None
+
+
+def _dense_reference(deltas, prices, start, end):
+    """Grille jour x item : position cumulée * dernier prix connu (0 sans prix), items présents des deux côtés."""
+    items = set(deltas["market_hash_name"]) & set(prices["market_hash_name"])
+    out = []
+    for day in pd.date_range(start, end, freq="D"):
+        total = 0.0
+        for name in items:
+            pos = deltas[(deltas["market_hash_name"] == name) & (deltas["date"] <= day)]["dq"].sum()
+            p = prices[(prices["market_hash_name"] == name) & (prices["date"] <= day)].sort_values("date")
+            total += pos * p["price_usd"].iloc[-1] if len(p) else 0.0
+        out.append(total)
+    return np.array(out)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_portfolio_value_matches_dense_grid(seed):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2026-03-01")
+    deltas = pd.DataFrame({
+        "market_hash_name": rng.choice(["A", "B", "C", "sans prix"], 25),
+        "date": start + pd.to_timedelta(rng.integers(0, 40, 25), unit="D"),
+        "dq": rng.choice([-2.0, -1.0, 1.0, 2.0, 3.0], 25),
+    }).groupby(["market_hash_name", "date"], as_index=False)["dq"].sum()
+    prices = pd.DataFrame({
+        "market_hash_name": rng.choice(["A", "B", "C", "jamais acheté"], 40),
+        "date": start + pd.to_timedelta(rng.integers(-5, 50, 40), unit="D"),
+        "price_usd": np.round(rng.uniform(1, 30, 40), 2),
+    }).drop_duplicates(["market_hash_name", "date"])
+    end = pd.Timestamp("2026-04-30")
+
+    series = valuation.portfolio_value(deltas, prices, end=end)
+    first = min(deltas["date"].min(), prices["date"].min())
+    assert series["date"].iloc[0] == first and series["date"].iloc[-1] == end
+    assert np.allclose(series["total_value_usd"], _dense_reference(deltas, prices, first, end))
+
+    window = valuation.portfolio_value(deltas, prices, start="2026-04-01", end=end)
+    assert np.allclose(window["total_value_usd"], _dense_reference(deltas, prices, "2026-04-01", end))
+    assert valuation.value_on(deltas, prices, "2026-03-20") == pytest.approx(
+        _dense_reference(deltas, prices, "2026-03-20", "2026-03-20")[0])
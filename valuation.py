@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Valuation
+
+Valeur quotidienne du portefeuille (courbe « Évolution de la valeur du portefeuille ») sans grille
+dense dates x items :
+
+- événements par item : variations de quantité (trades, cumulées par jour) et changements de prix
+  (dernier prix du jour) ; les prix ne sont gardés que pendant que l'item est détenu
+- à chaque événement, valeur de l'item = position courante * dernier prix connu ; la variation de
+  valeur par rapport à l'événement précédent du même item est ajoutée à la date de l'événement
+- la série quotidienne est la somme cumulée de ces variations (jours sans événement = valeur inchangée)
+
+Mémoire proportionnelle au nombre d'événements, pas au nombre de jours x items.
+Mêmes règles que l'ancien calcul : position = somme des BUY - SELL, prix reporté jusqu'au prix
+suivant, item sans prix connu compté 0, seuls les items présents dans les deux sources comptent.
+
+Série matérialisée par profil (data/<profil>/portfolio_value.csv : date, total_value_usd) :
+- fetch_prices.py ajoute / remplace le point du jour à chaque run (jours manquants recalculés)
+- une modification du journal des trades recalcule la série à partir de la date modifiée seulement :
+  l'app ne fait que noter cette date dans portfolio_value.dirty.jsonl (une ligne ajoutée, poussée
+  par la file write-behind), le robot recalcule à partir de la plus ancienne date pas encore traitée
+  et retient dans portfolio_value.meta.json le nombre de lignes traitées
+- seul le robot écrit portfolio_value.csv ; l'app lit ce petit fichier au lieu de reconstruire la courbe
+
+Usage:
+    python valuation.py update data/ [--since 2025-01-01]   # --since : recalcul à partir de cette date
+    python valuation.py bench --items 500 --days 1500       # contre l'ancien calcul dense (pivot / reindex / ffill)
+"""
+
+import io
+import os
+import json
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+import storage
+from atomic_io import file_lock, write_text_atomic
+from compact_history import bars_path, bars_to_ticks, read_bars
+from history_store import normalize_frame, read_schema_version
+
+VALUE_NAME = "portfolio_value.csv"
+VALUE_FIELDS = ["date", "total_value_usd"]
+DIRTY_NAME = "portfolio_value.dirty.jsonl"  # écrit par l'app (ajout seulement)
+META_NAME = "portfolio_value.meta.json"     # écrit par le robot
+
+
+def daily_trade_deltas(trades: pd.DataFrame) -> pd.DataFrame:
+    """Variation nette de quantité par (item, jour) : BUY +, tout le reste -."""
+    t = pd.DataFrame({
+        "date": pd.to_datetime(trades["date"], errors="coerce").dt.floor("D"),
+        "market_hash_name": trades["market_hash_name"],
+        "qty": pd.to_numeric(trades["qty"], errors="coerce"),
+        "type": trades["type"].astype(str).str.upper(),
+    }).dropna(subset=["date", "market_hash_name", "qty"])
+    t["dq"] = np.where(t["type"] == "BUY", t["qty"], -t["qty"])
+    return t.groupby(["market_hash_name", "date"], as_index=False)["dq"].sum()
+
+
+def daily_last_prices(hist: pd.DataFrame) -> pd.DataFrame:
+    """Dernier prix de chaque (item, jour) à partir des ticks (ts_utc, market_hash_name, price_usd)."""
+    h = pd.DataFrame({
+        "ts_utc": pd.to_datetime(hist["ts_utc"], errors="coerce", utc=True).dt.tz_localize(None),
+        "market_hash_name": hist["market_hash_name"],
+        "price_usd": pd.to_numeric(hist["price_usd"], errors="coerce"),
+    }).dropna()
+    h["date"] = h["ts_utc"].dt.floor("D")
+    h = h.sort_values(["market_hash_name", "date", "ts_utc"], kind="mergesort")
+    return h.groupby(["market_hash_name", "date"], as_index=False).tail(1)[["market_hash_name", "date", "price_usd"]]
+
+
+def _asof(keys: np.ndarray, codes: np.ndarray, q_keys: np.ndarray, q_codes: np.ndarray):
+    """Indice du dernier événement <= chaque requête pour le même item (-1 si aucun)."""
+    idx = np.searchsorted(keys, q_keys, side="right") - 1
+    ok = idx >= 0
+    ok[ok] = codes[idx[ok]] == q_codes[ok]
+    return np.where(ok, idx, -1)
+
+
+def value_events(deltas: pd.DataFrame, prices: pd.DataFrame, end=None):
+    """
+    Variations de valeur du portefeuille aux événements <= end -> (jours, dv), jours en datetime64[D].
+    deltas : market_hash_name, date, dq ; prices : market_hash_name, date, price_usd.
+    Clé d'événement = (code item, jour) en entier : recherches « dernier événement connu » par searchsorted.
+    """
+    items = pd.Index(deltas["market_hash_name"].unique()).intersection(pd.Index(prices["market_hash_name"].unique()))
+    d_code = items.get_indexer(deltas["market_hash_name"])
+    p_code = items.get_indexer(prices["market_hash_name"])
+    d_day = deltas["date"].to_numpy().astype("datetime64[D]").astype("int64")
+    p_day = prices["date"].to_numpy().astype("datetime64[D]").astype("int64")
+    d_ok, p_ok = d_code >= 0, p_code >= 0
+    if end is not None:
+        last = np.datetime64(pd.Timestamp(end).date(), "D").astype("int64")
+        d_ok &= d_day <= last
+        p_ok &= p_day <= last
+    if not d_ok.any() or not p_ok.any():
+        return np.empty(0, dtype="datetime64[D]"), np.empty(0)
+    d_code, d_day, dq = d_code[d_ok], d_day[d_ok], deltas["dq"].to_numpy(dtype="float64")[d_ok]
+    p_code, p_day, px = p_code[p_ok], p_day[p_ok], prices["price_usd"].to_numpy(dtype="float64")[p_ok]
+
+    base = min(d_day.min(), p_day.min())
+    span = int(max(d_day.max(), p_day.max()) - base) + 1
+    d_key = d_code * span + (d_day - base)
+    p_key = p_code * span + (p_day - base)
+
+    o = np.argsort(d_key, kind="mergesort")
+    d_key, d_code, dq = d_key[o], d_code[o], dq[o]
+    cum = np.cumsum(dq)
+    first = np.r_[True, d_code[1:] != d_code[:-1]]
+    pos = cum - np.repeat((cum - dq)[first], np.diff(np.r_[np.flatnonzero(first), len(dq)]))  # cumul par item
+
+    o = np.argsort(p_key, kind="mergesort")
+    p_key, p_code, px = p_key[o], p_code[o], px[o]
+
+    # prix vus seulement pendant la détention : position courante de l'item à la date du prix
+    i = _asof(d_key, d_code, p_key, p_code)
+    held = (i >= 0) & (np.where(i >= 0, pos[i], 0.0) != 0)
+    ev_key = np.unique(np.r_[d_key, p_key[held]])
+    ev_code = ev_key // span
+    i = _asof(d_key, d_code, ev_key, ev_code)
+    j = _asof(p_key, p_code, ev_key, ev_code)
+    value = np.where((i >= 0) & (j >= 0), np.where(i >= 0, pos[i], 0.0) * np.where(j >= 0, px[j], 0.0), 0.0)
+    value = np.nan_to_num(value)
+    prev = np.r_[0.0, value[:-1]]
+    dv = value - np.where(np.r_[True, ev_code[1:] != ev_code[:-1]], 0.0, prev)
+    return (ev_key % span + base).astype("datetime64[D]"), dv
+
+
+def portfolio_value(deltas: pd.DataFrame, prices: pd.DataFrame, start=None, end=None) -> pd.DataFrame:
+    """
+    Série quotidienne date, total_value_usd de start à end (par défaut : premier événement -> aujourd'hui
+    ou dernier prix). Vide si aucun item n'a à la fois des trades et des prix.
+    """
+    if deltas.empty or prices.empty:
+        return pd.DataFrame()
+    first = min(deltas["date"].min(), prices["date"].min())
+    end = pd.Timestamp(end).normalize() if end is not None else max(prices["date"].max(), pd.Timestamp.today().normalize())
+    if pd.isna(first) or first > end:
+        return pd.DataFrame()
+    days, dv = value_events(deltas, prices, end)
+    if len(days) == 0:
+        return pd.DataFrame()
+    dates = pd.date_range(first, end, freq="D")
+    offset = (days - np.datetime64(first.date(), "D")).astype("int64")
+    values = np.cumsum(np.bincount(offset, weights=dv, minlength=len(dates)))
+    out = pd.DataFrame({"date": dates, "total_value_usd": values})
+    if start is not None:
+        out = out[out["date"] >= pd.Timestamp(start)].reset_index(drop=True)
+    return out
+
+
+def value_on(deltas: pd.DataFrame, prices: pd.DataFrame, day) -> float:
+    """Valeur à une seule date : position cumulée * dernier prix connu, par item."""
+    day = pd.Timestamp(day).normalize()
+    pos = deltas[deltas["date"] <= day].groupby("market_hash_name")["dq"].sum()
+    p = prices[prices["date"] <= day].sort_values("date", kind="mergesort")
+    last = p.groupby("market_hash_name")["price_usd"].last()
+    common = pos.index.intersection(last.index)
+    return float((pos[common] * last[common]).fillna(0.0).sum())
+
+
+# ---------- série matérialisée ----------
+def value_path(profile_dir: str) -> str:
+    return os.path.join(profile_dir, VALUE_NAME)
+
+
+def _empty_series() -> pd.DataFrame:
+    return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "total_value_usd": pd.Series(dtype="float64")})
+
+
+def parse_series(blob) -> pd.DataFrame:
+    """Contenu de portfolio_value.csv (texte ou octets) -> date, total_value_usd triés."""
+    if isinstance(blob, bytes):
+        blob = blob.decode("utf-8", errors="replace")
+    if not blob or not blob.strip():
+        return _empty_series()
+    try:
+        df = pd.read_csv(io.StringIO(blob))
+    except Exception:
+        return _empty_series()
+    if not set(VALUE_FIELDS) <= set(df.columns):
+        return _empty_series()
+    df = pd.DataFrame({"date": pd.to_datetime(df["date"], errors="coerce"),
+                       "total_value_usd": pd.to_numeric(df["total_value_usd"], errors="coerce")})
+    return df.dropna(subset=["date"]).sort_values("date").reset_index(drop=True)
+
+
+def read_series(path: str) -> pd.DataFrame:
+    if not os.path.isfile(path):
+        return _empty_series()
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_series(f.read())
+
+
+def series_to_csv(series: pd.DataFrame) -> str:
+    if series.empty:
+        return ",".join(VALUE_FIELDS) + "\n"
+    out = pd.DataFrame({"date": pd.to_datetime(series["date"]).dt.strftime("%Y-%m-%d"),
+                        "total_value_usd": series["total_value_usd"].round(2)})
+    return out.to_csv(index=False)
+
+
+def write_series(path: str, series: pd.DataFrame):
+    write_text_atomic(path, series_to_csv(series))
+
+
+# ---------- dates à recalculer (app -> robot) ----------
+def dirty_path(profile_dir: str) -> str:
+    return os.path.join(profile_dir, DIRTY_NAME)
+
+
+def meta_path(profile_dir: str) -> str:
+    return os.path.join(profile_dir, META_NAME)
+
+
+def mark_dirty(profile_dir: str, since) -> str:
+    """Côté app : note que la série est à recalculer à partir de `since` (une ligne ajoutée, fsync)."""
+    path = dirty_path(profile_dir)
+    os.makedirs(profile_dir or ".", exist_ok=True)
+    line = json.dumps({"since": pd.Timestamp(since).strftime("%Y-%m-%d"), "ts": round(time.time(), 3)})
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+
+def parse_dirty(blob) -> List[Optional[pd.Timestamp]]:
+    """Lignes de portfolio_value.dirty.jsonl -> dates (None pour une ligne illisible, gardée pour le décompte)."""
+    if isinstance(blob, bytes):
+        blob = blob.decode("utf-8", errors="replace")
+    out = []
+    for line in (blob or "").splitlines():
+        if not line.strip():
+            continue
+        try:
+            day = pd.Timestamp(json.loads(line)["since"]).normalize()
+        except Exception:
+            day = None
+        out.append(None if day is pd.NaT else day)
+    return out
+
+
+def read_dirty(profile_dir: str) -> List[Optional[pd.Timestamp]]:
+    path = dirty_path(profile_dir)
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_dirty(f.read())
+
+
+def parse_meta(blob) -> dict:
+    if isinstance(blob, bytes):
+        blob = blob.decode("utf-8", errors="replace")
+    try:
+        meta = json.loads(blob or "{}")
+    except Exception:
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def read_meta(profile_dir: str) -> dict:
+    path = meta_path(profile_dir)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_meta(f.read())
+
+
+def pending_since(marks: List[Optional[pd.Timestamp]], meta: dict) -> Optional[pd.Timestamp]:
+    """
+    Plus ancienne date notée après les `dirty_lines` lignes déjà traitées par le robot.
+    Fichier plus court que le décompte (réécrit à la main) : tout est repris.
+    """
+    done = int(meta.get("dirty_lines", 0) or 0)
+    fresh = [d for d in (marks[done:] if done <= len(marks) else marks) if d is not None]
+    return min(fresh) if fresh else None
+
+
+def patch_series(existing: pd.DataFrame, deltas: pd.DataFrame, prices: pd.DataFrame, since=None, end=None) -> pd.DataFrame:
+    """
+    Points antérieurs à `since` gardés, le reste recalculé (tout si since est None ou rien n'est gardé).
+    Le recalcul repart au plus tard du lendemain du dernier point gardé : une série en retard n'a pas de trou.
+    """
+    since = pd.Timestamp(since).normalize() if since is not None else None
+    kept = existing[existing["date"] < since] if since is not None else existing.iloc[0:0]
+    if kept.empty:
+        fresh = portfolio_value(deltas, prices, end=end)
+        return fresh if not fresh.empty else _empty_series()
+    since = min(since, kept["date"].max() + pd.Timedelta(days=1))
+    fresh = portfolio_value(deltas, prices, start=since, end=end)
+    if fresh.empty:
+        return kept.reset_index(drop=True)
+    return pd.concat([kept, fresh], ignore_index=True)
+
+
+def extend_series(existing: pd.DataFrame, deltas: pd.DataFrame, prices: pd.DataFrame, today=None) -> pd.DataFrame:
+    """Run du robot : point du jour ajouté (ou remplacé) ; si des jours manquent, recalcul depuis le dernier point."""
+    today = pd.Timestamp(today if today is not None else pd.Timestamp.today()).normalize()
+    if existing.empty:
+        return patch_series(existing, deltas, prices, end=today)
+    last = existing["date"].max()
+    if last < today - pd.Timedelta(days=1):
+        return patch_series(existing, deltas, prices, since=last + pd.Timedelta(days=1), end=today)
+    point = pd.DataFrame({"date": [today], "total_value_usd": [value_on(deltas, prices, today)]})
+    return pd.concat([existing[existing["date"] < today], point], ignore_index=True)
+
+
+def profile_prices(profile_dir: str) -> pd.DataFrame:
+    """Derniers prix journaliers d'un profil : ticks de price_history.csv, barres journalières avant le premier tick."""
+    history_path = os.path.join(profile_dir, "price_history.csv")
+    try:
+        ticks = normalize_frame(pd.read_csv(history_path, on_bad_lines="skip"), read_schema_version(history_path))
+    except Exception:
+        ticks = normalize_frame(pd.DataFrame())
+    frames = []
+    if not ticks.empty:
+        frames.append(pd.DataFrame({"ts_utc": pd.to_datetime(ticks["ts"], unit="s", utc=True),
+                                    "market_hash_name": ticks["market_hash_name"],
+                                    "price_usd": ticks["price_cents"].astype("float64") / 100.0}))
+    bars = bars_to_ticks(read_bars(bars_path(history_path)))
+    if not bars.empty:
+        if frames:
+            bars = bars[bars["ts_utc"] < frames[0]["ts_utc"].min().floor("D")]
+        frames.append(bars[["ts_utc", "market_hash_name", "price_usd"]])
+    if not frames:
+        return pd.DataFrame(columns=["market_hash_name", "date", "price_usd"])
+    return daily_last_prices(pd.concat(frames, ignore_index=True))
+
+
+def update_profile(profile_dir: str, since=None, today=None) -> pd.DataFrame:
+    """
+    Met à jour data/<profil>/portfolio_value.csv : recalcul depuis la plus ancienne des dates `since`
+    et notées par l'app (portfolio_value.dirty.jsonl), sinon point du jour.
+    """
+    trades = storage.CsvStorage(profile_dir).load("trades")
+    deltas = daily_trade_deltas(trades) if not trades.empty else pd.DataFrame(columns=["market_hash_name", "date", "dq"])
+    prices = profile_prices(profile_dir)
+    path = value_path(profile_dir)
+    with file_lock(path):
+        marks = read_dirty(profile_dir)
+        dirty = pending_since(marks, read_meta(profile_dir))
+        if since is not None:
+            since = pd.Timestamp(since).normalize()
+            dirty = since if dirty is None else min(since, dirty)
+        existing = read_series(path)
+        if dirty is not None:
+            series = patch_series(existing, deltas, prices, since=dirty, end=today)
+        else:
+            series = extend_series(existing, deltas, prices, today=today)
+        write_series(path, series)
+        write_text_atomic(meta_path(profile_dir), json.dumps({"dirty_lines": len(marks)}) + "\n")
+    return series
+
+
+def _profile_dirs(paths: List[str]) -> List[str]:
+    """Dossiers data/<profil> (ceux qui ont un trades.csv) ou racine data/."""
+    out = []
+    for p in paths:
+        if os.path.isfile(os.path.join(p, "trades.csv")):
+            out.append(p)
+        elif os.path.isdir(p):
+            out += [os.path.join(p, d) for d in sorted(os.listdir(p)) if os.path.isfile(os.path.join(p, d, "trades.csv"))]
+    return out
+
+
+# ---------- benchmark ----------
+def _dense_portfolio_value(deltas: pd.DataFrame, prices: pd.DataFrame) -> pd.DataFrame:
+    """Ancien build_portfolio_timeseries (grilles dates x items), pour comparaison."""
+    start = min(prices["date"].min(), deltas["date"].min())
+    end = max(prices["date"].max(), pd.Timestamp.today().normalize())
+    dates = pd.date_range(start, end, freq="D")
+    pos = (deltas.pivot(index="date", columns="market_hash_name", values="dq")
+           .fillna(0.0).reindex(dates).fillna(0.0).cumsum())
+    px = prices.pivot(index="date", columns="market_hash_name", values="price_usd").reindex(dates).ffill()
+    common = pos.columns.intersection(px.columns)
+    total = (pos[common] * px[common]).sum(axis=1).rename("total_value_usd").to_frame()
+    total.index.name = "date"
+    return total.reset_index()
+
+
+def synthetic_events(items: int, days: int, hold_days: int = 30, seed: int = 3):
+    """Chaque item est acheté puis revendu après ~hold_days jours ; un prix par item et par jour."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp.today().normalize() - pd.Timedelta(days=days)
+    names = np.array([f"Item {i:04d}" for i in range(items)])
+    buy = rng.integers(0, days - hold_days, items)
+    sell = buy + rng.integers(1, hold_days, items)
+    deltas = pd.DataFrame({
+        "market_hash_name": np.r_[names, names],
+        "date": start + pd.to_timedelta(np.r_[buy, sell], unit="D"),
+        "dq": np.r_[rng.integers(1, 5, items), np.zeros(items)].astype("float64"),
+    })
+    deltas.loc[items:, "dq"] = -deltas["dq"].to_numpy()[:items]
+    grid_items = np.repeat(names, days)
+    grid_days = np.tile(np.arange(days), items)
+    prices = pd.DataFrame({
+        "market_hash_name": grid_items,
+        "date": start + pd.to_timedelta(grid_days, unit="D"),
+        "price_usd": np.round(rng.uniform(0.5, 500.0, items * days), 2),
+    })
+    return deltas, prices
+
+
+def _measure(fn, *args):
+    """Résultat, durée (ms) et pic mémoire Python (Mo, second passage sous tracemalloc)."""
+    t0 = time.perf_counter()
+    out = fn(*args)
+    ms = (time.perf_counter() - t0) * 1000.0
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return out, ms, peak
+
+
+def bench(items: int, days: int, legacy: bool = True) -> dict:
+    deltas, prices = synthetic_events(items, days)
+    res = {}
+    new, res["sparse_ms"], res["sparse_peak_mb"] = _measure(portfolio_value, deltas, prices)
+    if legacy:
+        old, res["dense_ms"], res["dense_peak_mb"] = _measure(_dense_portfolio_value, deltas, prices)
+        res["same_result"] = bool(len(old) == len(new) and np.allclose(old["total_value_usd"], new["total_value_usd"]))
+    return res
+
+
+def main(argv: Optional[list] = None):
+    p = argparse.ArgumentParser(description="Valeur quotidienne du portefeuille par événements")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    u = sub.add_parser("update", help="met à jour portfolio_value.csv (point du jour, ou recalcul avec --since)")
+    u.add_argument("paths", nargs="+", help="dossier data/<profil> ou racine data/")
+    u.add_argument("--since", default=None, help="recalculer à partir de cette date (AAAA-MM-JJ)")
+    b = sub.add_parser("bench", help="compare l'ancien calcul dense au calcul par événements")
+    b.add_argument("--items", type=int, default=500)
+    b.add_argument("--days", type=int, default=1500)
+    b.add_argument("--no-legacy", action="store_true", help="ne pas chronométrer l'ancienne implémentation")
+    args = p.parse_args(argv)
+
+    if args.cmd == "update":
+        for d in _profile_dirs(args.paths):
+            series = update_profile(d, since=args.since)
+            last = f"{series['total_value_usd'].iloc[-1]:.2f} USD" if not series.empty else "vide"
+            print(f"[VALUE] {d}: {len(series)} points, dernier = {last}")
+        return
+
+    res = bench(args.items, args.days, legacy=not args.no_legacy)
+    for k, v in res.items():
+        print(f"[BENCH] {k}: {v:.1f}" if isinstance(v, float) else f"[BENCH] {k}: {v}")
+
+if __name__ == "__main__":
+    sys.exit(main())
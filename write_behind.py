@@ -0,0 +1,142 @@
+"""
+Write Behind
+
+File d'attente des push GitHub de l'app : une sauvegarde écrit le CSV local tout de suite
+et met le push en file ; un thread de fond pousse ensuite.
+
+- file durable : journal JSONL (une ligne par sauvegarde, fsync), rejoué au redémarrage
+- coalescence : toutes les entrées en attente partent dans un seul commit, avec le contenu
+  local courant de chaque fichier (deux sauvegardes du même fichier = un seul envoi)
+- échec : les entrées restent en file, nouvel essai avec backoff exponentiel
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+from atomic_io import write_text_atomic
+
+QUEUE_NAME = ".push_queue.jsonl"
+DEBOUNCE = 0.5        # secondes d'attente pour regrouper une rafale de sauvegardes
+MAX_BACKOFF = 300.0   # secondes entre deux essais au pire
+MAX_MESSAGES = 5      # messages listés dans le commit groupé
+
+
+def _read_file(path: str) -> Optional[str]:
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _group_message(messages: List[str]) -> str:
+    uniq = list(dict.fromkeys(m for m in messages if m))
+    if len(uniq) <= 1:
+        return uniq[0] if uniq else "update data"
+    head = "; ".join(uniq[:MAX_MESSAGES])
+    more = f" (+{len(uniq) - MAX_MESSAGES})" if len(uniq) > MAX_MESSAGES else ""
+    return f"{len(uniq)} saves: {head}{more}"
+
+
+class WriteBehindQueue:
+    """
+    push(files: {chemin: texte}, message) -> code HTTP, appelé depuis le thread de fond.
+    Les chemins sont relus au moment du push (`read`, par défaut le fichier sur disque) :
+    c'est la dernière version qui part.
+    """
+
+    def __init__(self, queue_path: str, push: Callable[[Dict[str, str], str], int],
+                 read: Optional[Callable[[str], Optional[str]]] = None):
+        self.queue_path = queue_path
+        self.push = push
+        self.read = read or _read_file
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.entries = self._load()
+        self.seq = max((e["seq"] for e in self.entries), default=0)
+        self.status = {"pending": len(self.entries), "pushing": False, "last_push": None,
+                       "last_status": None, "last_error": None, "retry_at": None}
+        self.thread = threading.Thread(target=self._run, name="gh-write-behind", daemon=True)
+        self.thread.start()
+        if self.entries:
+            self.wake.set()
+
+    # ---------- journal ----------
+    def _load(self) -> List[dict]:
+        if not os.path.isfile(self.queue_path):
+            return []
+        out = []
+        with open(self.queue_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    out.append(json.loads(line))
+                except ValueError:
+                    continue  # ligne tronquée (arrêt en pleine écriture)
+        return out
+
+    def _rewrite(self):
+        write_text_atomic(self.queue_path, "".join(json.dumps(e) + "\n" for e in self.entries))
+
+    def enqueue(self, paths: List[str], message: str):
+        """Ajoute une sauvegarde (fichiers déjà écrits en local) ; rend la main immédiatement."""
+        with self.lock:
+            self.seq += 1
+            entry = {"seq": self.seq, "paths": list(paths), "message": message, "ts": time.time()}
+            os.makedirs(os.path.dirname(self.queue_path) or ".", exist_ok=True)
+            with open(self.queue_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries.append(entry)
+            self.status["pending"] = len(self.entries)
+            self.status["retry_at"] = None
+        self.wake.set()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.status)
+
+    # ---------- worker ----------
+    def _take_batch(self):
+        with self.lock:
+            batch = list(self.entries)
+        paths = list(dict.fromkeys(p for e in batch for p in e["paths"]))
+        files = {}
+        for p in paths:
+            content = self.read(p)
+            if content is not None:
+                files[p] = content
+        return batch, files
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            self.wake.wait(timeout=backoff or None)
+            time.sleep(DEBOUNCE)
+            self.wake.clear()  # les sauvegardes de la rafale partent dans ce lot
+            batch, files = self._take_batch()
+            if not batch:
+                backoff = 0.0
+                continue
+            with self.lock:
+                self.status["pushing"] = True
+            try:
+                code = self.push(files, _group_message([e["message"] for e in batch])) if files else 200
+                error = None if 200 <= code < 300 else f"HTTP {code}"
+            except Exception as e:  # réseau, timeout... : on garde la file
+                code, error = None, str(e)[:200]
+            done = max(e["seq"] for e in batch)
+            with self.lock:
+                if error is None:
+                    self.entries = [e for e in self.entries if e["seq"] > done]
+                    self._rewrite()
+                    self.status["last_push"] = time.time()
+                    backoff = 0.0
+                else:
+                    backoff = min(MAX_BACKOFF, max(2.0, backoff * 2))
+                self.status.update({"pending": len(self.entries), "pushing": False, "last_status": code,
+                                    "last_error": error, "retry_at": time.time() + backoff if error else None})
+                if self.entries and error is None:
+                    self.wake.set()  # sauvegardes arrivées pendant le push